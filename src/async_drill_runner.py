@@ -0,0 +1,214 @@
+"""
+async_drill_runner.py
+---
+This file contains the AsyncDrillRunner class, which runs a ThreadedDrillSessionHandler's drill on an asyncio event loop using the motors' async counterparts, so that one thread can drive all six motors.
+---
+
+Author: Ball-E contributors
+Date: October 17, 2026
+Last Modified: October 17, 2026
+"""
+
+import asyncio
+
+import drill_cancel
+import drill_plan
+import threaded_drill_session_handler
+
+
+class AsyncDrillRunner:
+    """Runs a manual or automated drill with awaitable motor commands and timers instead of blocking sleeps and HLFB waits
+    """
+
+    def __init__(self, session_handler):
+        """Initializes the runner
+
+        Args:
+            session_handler ([ThreadedDrillSessionHandler]): Handler whose motors, shot angle table and drill plan are used
+        """
+
+        self.session_handler = session_handler
+
+        # Motors are shared with the session handler
+        self.bfm = session_handler.bfm
+        self.bqm = session_handler.bqm
+        self.fmt = session_handler.fmt
+        self.fmb = session_handler.fmb
+        self.pm = session_handler.pm
+        self.ym = session_handler.ym
+
+    async def start_drill(self):
+        """Async counterpart of ThreadedDrillSessionHandler.start_drill
+        """
+
+        # Waits may have been cancelled by a previous session
+        drill_cancel.reset()
+
+        # The session is told about the HLFB timeouts from now on
+        self.session_handler.attach_hlfb_monitors()
+
+        # Enable all motors
+        # NOTE 1: Order matters! The BQM is energized once the feed is back and the other motors are ready.
+        # NOTE 2: BFM not energized since it will cause motor to move but it is pushed back a bit to ensure the feed is all the way back.
+        await asyncio.gather(
+            self.bfm.move_backward_async(en_time=0.25),
+            self.fmt.energize_motor_async(),
+            self.fmb.energize_motor_async(),
+            self.ym.energize_motor_async(),
+            self.pm.energize_motor_async())
+        await self.bqm.energize_motor_async()
+
+    async def run_automated_drill(self):
+        """Async counterpart of ThreadedDrillSessionHandler.run_automated_drill
+        """
+
+        self.session_handler.rof_scheduler.reset()
+        # Go through each ball and shoot it
+        for drill_plan_step in self.session_handler.drill_plan:
+            await self.run_drill_plan_step(drill_plan_step)
+            # Update the ball number in the GUI
+            self.session_handler.update_ball_num_signal.emit(True)
+        # When complete, stop the drill
+        await self.stop_drill()
+
+    async def run_manual_drill(self, shot_loc, ball_speed):
+        """Async counterpart of ThreadedDrillSessionHandler.run_manual_drill
+
+        Args:
+            shot_loc ([str]): Shot location
+            ball_speed ([int]): Ball speed
+        """
+
+        if self.session_handler.run_drill:
+            drill_plan_step = drill_plan.compile_shot(
+                None, self.session_handler.prev_shot_loc, shot_loc, ball_speed, self.session_handler.shot_angle_table, self.fmt, self.fmb, self.bfm)
+            await self.run_drill_plan_step(drill_plan_step)
+
+    async def run_drill_plan_step(self, drill_plan_step):
+        """Shoots one ball using an already compiled drill plan step, running the stages of ShotEngine (aim, drop, fire and return) one after another
+
+        Args:
+            drill_plan_step ([DrillPlanStep]): Step to shoot
+        """
+
+        if self.session_handler.run_drill:
+            print("\n\nShot location: {}".format(drill_plan_step.shot_loc))
+            # 1. Adjust pitch and yaw motor appropriately and set the speed of both flywheels at the same time
+            self.session_handler.shot_aborted = False
+            await self.run_aiming_stage(drill_plan_step)
+
+            # Update shot location for relative test
+            # NOTE: The axes may have moved even if one of their commands was aborted
+            self.session_handler.prev_shot_loc = drill_plan_step.shot_loc
+
+            # A motor's HLFB recovery aborted the shot, so no ball is dropped or fired
+            if self.session_handler.shot_aborted:
+                print("Shot at {} aborted: a motor did not confirm its command".format(
+                    drill_plan_step.shot_loc))
+                return
+
+            # 2. Drop a ball by moving the ball queue motor
+            await self.bqm.turn_once_async()
+
+            # 3. Wait for the ball's ROF deadline and report if it is late
+            lag = await self.session_handler.rof_scheduler.wait_for_fire_time_async()
+            self.session_handler.shot_lag_signal.emit(lag)
+
+            # 4. Shoot the ball
+            await self.bfm_shoot_movement(drill_plan_step.feed_stroke_time)
+
+    async def run_aiming_stage(self, drill_plan_step):
+        """Async counterpart of ThreadedDrillSessionHandler.run_aiming_stage. All the motor commands run as coroutines on the same event loop.
+
+        Args:
+            drill_plan_step ([DrillPlanStep]): Step holding the yaw/pitch move (or positions) and flywheel duty cycles
+        """
+
+        shot_move = drill_plan_step.shot_move
+
+        motor_coroutines = []
+        if self.session_handler.aiming_mode == "absolute":
+            motor_coroutines.append(
+                self.ym.move_to_async(drill_plan_step.yaw_position))
+            motor_coroutines.append(
+                self.pm.move_to_async(drill_plan_step.pitch_position))
+        else:
+            if shot_move.yaw_angle < 0:
+                motor_coroutines.append(self.ym.move_left_async(
+                    shot_move.yaw_angle, shot_move.yaw_pulses))
+            elif shot_move.yaw_angle > 0:
+                motor_coroutines.append(self.ym.move_right_async(
+                    shot_move.yaw_angle, shot_move.yaw_pulses))
+            if shot_move.pitch_angle < 0:
+                motor_coroutines.append(self.pm.pitch_down_async(
+                    shot_move.pitch_angle, shot_move.pitch_pulses))
+            elif shot_move.pitch_angle > 0:
+                motor_coroutines.append(self.pm.pitch_up_async(
+                    shot_move.pitch_angle, shot_move.pitch_pulses))
+        motor_coroutines.append(
+            self.fmt.set_duty_cycle_async(drill_plan_step.top_duty_cycle))
+        motor_coroutines.append(
+            self.fmb.set_duty_cycle_async(drill_plan_step.bottom_duty_cycle))
+
+        # The slowest motor decides how long this takes
+        await asyncio.gather(*motor_coroutines)
+
+    async def bfm_shoot_movement(self, feed_stroke_time=None):
+        """Async counterpart of ThreadedDrillSessionHandler.bfm_shoot_movement
+
+        Args:
+            feed_stroke_time ([float], optional): How long each direction of the bfm movement takes. Defaults to the BFM's stroke time.
+        """
+
+        await self.bfm.move_forward_async(en_time=feed_stroke_time)
+        await self.bfm.move_backward_async(en_time=feed_stroke_time)
+
+    async def stop_drill(self):
+        """Async counterpart of ThreadedDrillSessionHandler.stop_drill
+        """
+
+        with self.session_handler.drill_stopped_lock:
+            if self.session_handler.drill_stopped:
+                return
+            self.session_handler.drill_stopped = True
+
+        self.session_handler.run_drill = False
+        # Stop running the drill
+        self.session_handler.run_drill_signal.emit(False)
+
+        # The yaw and pitch pulse trains stop between two pulses and drop the trains still queued. They must be done before the cancel is reset, or the rest of their pulses would still be emitted.
+        await asyncio.gather(self.ym.pulse_train.wait_for_idle_async(),
+                             self.pm.pulse_train.wait_for_idle_async())
+
+        # The motors are about to be reset, which has to wait for their strokes and HLFB edges again
+        drill_cancel.reset()
+
+        # Resetting the motors is not part of the drill, so its HLFB timeouts are neither retried nor counted against the session
+        self.session_handler.detach_hlfb_monitors()
+
+        # Save the drill profile to the goalie's name
+        if self.session_handler.goalie_name is not None:
+            self.session_handler.save_drill_to_goalie_profile()
+
+        # Stop and reset all motors at the same time, keeping their channels set up for the next session
+        await asyncio.gather(*[motor.stop_and_reset_motor_async(release=False)
+                               for motor in self.session_handler.motor_context.get_motors().values()])
+
+
+def main():
+    """main.
+
+    Main prototype/testing area. Code prototyping and checking happens here.
+    """
+
+    automated_session = AsyncDrillRunner(
+        threaded_drill_session_handler.ThreadedDrillSessionHandler(10, drill_name="t_drill"))
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(automated_session.start_drill())
+    loop.run_until_complete(automated_session.run_automated_drill())
+
+
+if __name__ == "__main__":
+    # Run the main function
+    main()
@@ -0,0 +1,116 @@
+"""
+drill_cancel.py
+---
+This file contains the shared cancellation event. Once a drill is stopped, every wait in the motor classes and handlers (strokes, HLFB edges, ROF deadlines) returns right away, so that the motors can be reset without waiting for the shot in progress.
+---
+
+Author: Ball-E contributors
+Date: October 17, 2026
+Last Modified: October 17, 2026
+"""
+
+import asyncio
+import threading
+
+# Set while a drill is being stopped
+cancel_event = threading.Event()
+
+# Functions called when the cancel event is set (e.g.: to wake a thread waiting on something else)
+cancel_callbacks = []
+cancel_callbacks_lock = threading.Lock()
+
+
+def cancel():
+    """Sets the cancel event and wakes every wait
+    """
+
+    with cancel_callbacks_lock:
+        cancel_event.set()
+        callbacks = list(cancel_callbacks)
+
+    for cancel_callback in callbacks:
+        cancel_callback()
+
+
+def reset():
+    """Clears the cancel event, so that waits are not interrupted anymore (e.g.: once the motors are being reset)
+    """
+    cancel_event.clear()
+
+
+def is_cancelled():
+    """Returns whether the cancel event is set
+
+    Returns:
+        [bool]: True if cancelled, False otherwise
+    """
+    return cancel_event.is_set()
+
+
+def add_cancel_callback(cancel_callback):
+    """Calls cancel_callback() when the cancel event is set. If it already is, it is called right away.
+
+    Args:
+        cancel_callback ([function]): Function to call
+    """
+
+    with cancel_callbacks_lock:
+        if not cancel_event.is_set():
+            cancel_callbacks.append(cancel_callback)
+            return
+
+    cancel_callback()
+
+
+def remove_cancel_callback(cancel_callback):
+    """Removes a callback added with add_cancel_callback
+
+    Args:
+        cancel_callback ([function]): Function to remove
+    """
+
+    with cancel_callbacks_lock:
+        if cancel_callback in cancel_callbacks:
+            cancel_callbacks.remove(cancel_callback)
+
+
+def sleep(duration):
+    """Interruptible counterpart of time.sleep
+
+    Args:
+        duration ([float]): Time to sleep in seconds
+
+    Returns:
+        [bool]: True if the whole duration was slept, False if cancelled
+    """
+    return not cancel_event.wait(duration)
+
+
+async def sleep_async(duration):
+    """Interruptible counterpart of asyncio.sleep
+
+    Args:
+        duration ([float]): Time to sleep in seconds
+
+    Returns:
+        [bool]: True if the whole duration was slept, False if cancelled
+    """
+
+    loop = asyncio.get_event_loop()
+    cancel_future = loop.create_future()
+
+    def set_future_done():
+        if not cancel_future.done():
+            cancel_future.set_result(False)
+
+    # cancel() may be called from any thread, so the future is completed through the event loop
+    def wake_loop():
+        loop.call_soon_threadsafe(set_future_done)
+
+    add_cancel_callback(wake_loop)
+    try:
+        return await asyncio.wait_for(cancel_future, duration)
+    except asyncio.TimeoutError:
+        return True
+    finally:
+        remove_cancel_callback(wake_loop)
@@ -0,0 +1,336 @@
+"""
+drill_plan.py
+---
+This file contains the drill plan compiler, which turns a drill's CSV information into a list of ready-to-execute shot steps before the first ball is shot.
+---
+
+Author: Ball-E contributors
+Date: October 17, 2026
+Last Modified: October 17, 2026
+"""
+
+from collections import namedtuple
+
+# All shot locations on the lacrosse goal
+SHOT_LOCATIONS = ["TL", "TM", "TR", "CL", "CM", "CR", "BL", "BM", "BR"]
+
+# Shot location the yaw and pitch motors point at when they are centered (encoder count 0)
+HOME_SHOT_LOC = "CM"
+
+# Relative move (angles and enable pulses) the yaw and pitch motors need to go from one shot location to another
+# NOTE: The sign of each angle is the direction (negative is left for yaw and down for pitch)
+ShotMove = namedtuple(
+    "ShotMove", ["yaw_angle", "pitch_angle", "yaw_pulses", "pitch_pulses"])
+
+# Everything the session handler needs to shoot one ball, already converted to motor commands
+# NOTE: shot_move is relative to the previous shot, while yaw_position and pitch_position are absolute encoder counts from HOME_SHOT_LOC
+DrillPlanStep = namedtuple(
+    "DrillPlanStep", ["ball_num", "shot_loc", "ball_speed", "shot_move", "yaw_position", "pitch_position", "top_duty_cycle", "bottom_duty_cycle", "feed_stroke_time"])
+
+# Shot orders a drill can be run in
+# "fixed": CSV order, "any": the whole drill is order-insensitive, "blocks": order-insensitive within consecutive blocks of balls
+# NOTE: Like the ROF, a drill's shot order is kept in the row of its first ball, in the optional "Order" and "Block Size" columns (Ball,Loc,Speed,ROF,Order,Block Size). Drills without them are "fixed".
+SHOT_ORDERS = ["fixed", "any", "blocks"]
+
+# Ways the yaw and pitch motors can be aimed
+# "relative": move by the difference from the previous shot location, "absolute": move to the shot location's encoder count
+AIMING_MODES = ["relative", "absolute"]
+
+# Time (in seconds) the flywheels take to go across their whole duty cycle range. This is the HLFB timeout the flywheel motors wait for.
+FLYWHEEL_SPIN_UP_TIME = 2
+
+
+class DrillPlanError(Exception):
+    """Raised when a drill cannot be turned into a plan (e.g.: unknown shot location or unreachable ball speed)
+    """
+
+
+def build_shot_angle_table(trajectory_algo, ym, pm):
+    """Calculates the relative yaw/pitch move between every pair of shot locations
+
+    Args:
+        trajectory_algo ([TrajectoryAlgorithm]): Trajectory algorithm helper for the session's distance from the goal
+        ym ([MotorYaw]): Yaw motor, used to convert angles to enable pulses
+        pm ([MotorPitch]): Pitch motor, used to convert angles to enable pulses
+
+    Returns:
+        [dict]: ShotMove keyed by (previous shot location, shot location)
+    """
+
+    # Only one trajectory calculation per shot location is needed
+    shot_angles = {shot_loc: (trajectory_algo.calc_yaw(shot_loc), trajectory_algo.calc_pitch(shot_loc))
+                   for shot_loc in SHOT_LOCATIONS}
+
+    shot_angle_table = dict()
+    for prev_shot_loc, (prev_yaw_angle, prev_pitch_angle) in shot_angles.items():
+        for shot_loc, (yaw_angle, pitch_angle) in shot_angles.items():
+            # This is the relative angle we want to move the pitch and yaw contraptions by
+            target_yaw_angle = yaw_angle - prev_yaw_angle
+            target_pitch_angle = pitch_angle - prev_pitch_angle
+            shot_angle_table[(prev_shot_loc, shot_loc)] = ShotMove(
+                yaw_angle=target_yaw_angle,
+                pitch_angle=target_pitch_angle,
+                yaw_pulses=ym.degree_to_pulses(target_yaw_angle),
+                pitch_pulses=pm.degree_to_pulses(target_pitch_angle))
+
+    return shot_angle_table
+
+
+def get_shot_position(shot_angle_table, shot_loc):
+    """Returns the absolute yaw and pitch encoder counts for a shot location
+
+    Args:
+        shot_angle_table ([dict]): Table from build_shot_angle_table
+        shot_loc ([str]): Shot location
+
+    Returns:
+        [tuple]: Yaw encoder count, Pitch encoder count (in fine pulses from HOME_SHOT_LOC)
+    """
+
+    # The move from home is the absolute position, with the sign of the angle as the direction
+    home_move = shot_angle_table[(HOME_SHOT_LOC, shot_loc)]
+    yaw_position = home_move.yaw_pulses
+    if home_move.yaw_angle < 0:
+        yaw_position = -yaw_position
+    pitch_position = home_move.pitch_pulses
+    if home_move.pitch_angle < 0:
+        pitch_position = -pitch_position
+
+    return yaw_position, pitch_position
+
+
+def compile_shot(ball_num, prev_shot_loc, shot_loc, ball_speed, shot_angle_table, fmt, fmb, bfm):
+    """Turns one shot into a DrillPlanStep
+
+    Args:
+        ball_num ([str]): Ball number (only used for error messages and progress)
+        prev_shot_loc ([str]): Shot location the machine is aimed at before this shot
+        shot_loc ([str]): Shot location
+        ball_speed ([int or str]): Ball speed (in MPH)
+        shot_angle_table ([dict]): Table from build_shot_angle_table
+        fmt ([MotorFlywheelTop]): Top flywheel motor, used to convert the speed to a duty cycle
+        fmb ([MotorFlywheelBottom]): Bottom flywheel motor, used to convert the speed to a duty cycle
+        bfm ([MotorBallFeed]): Ball feed motor, used for the feed stroke time
+
+    Raises:
+        DrillPlanError: If the shot cannot be executed
+
+    Returns:
+        [DrillPlanStep]: The ready-to-execute step
+    """
+
+    if shot_loc not in SHOT_LOCATIONS:
+        raise DrillPlanError(
+            "Ball {}: unknown shot location '{}'".format(ball_num, shot_loc))
+
+    try:
+        ball_speed = int(ball_speed)
+    except ValueError:
+        raise DrillPlanError(
+            "Ball {}: ball speed '{}' is not a number".format(ball_num, ball_speed))
+
+    top_duty_cycle = fmt.speed_to_duty_cycle(ball_speed)
+    bottom_duty_cycle = fmb.speed_to_duty_cycle(ball_speed)
+    for duty_cycle in (top_duty_cycle, bottom_duty_cycle):
+        if not 0 < duty_cycle <= 100:
+            raise DrillPlanError(
+                "Ball {}: ball speed {} mph is out of the flywheels' range".format(ball_num, ball_speed))
+
+    feed_stroke_time = bfm.stroke_time
+
+    yaw_position, pitch_position = get_shot_position(
+        shot_angle_table, shot_loc)
+
+    return DrillPlanStep(
+        ball_num=ball_num,
+        shot_loc=shot_loc,
+        ball_speed=ball_speed,
+        shot_move=shot_angle_table[(prev_shot_loc, shot_loc)],
+        yaw_position=yaw_position,
+        pitch_position=pitch_position,
+        top_duty_cycle=top_duty_cycle,
+        bottom_duty_cycle=bottom_duty_cycle,
+        feed_stroke_time=feed_stroke_time)
+
+
+def get_drill_rof(drill_info):
+    """Returns the rate of fire of a drill, which is kept in the row of its first ball
+
+    Args:
+        drill_info ([dict]): Drill information from get_profile_info ([shot location, ball speed, ROF] keyed by ball number)
+
+    Raises:
+        DrillPlanError: If the drill has no balls, or its ROF is missing or not a positive number
+
+    Returns:
+        [int]: Rate of fire (in seconds)
+    """
+
+    if not drill_info:
+        raise DrillPlanError("The drill has no balls")
+
+    ball_num, first_ball_info = next(iter(drill_info.items()))
+    try:
+        rof = int(first_ball_info[2])
+    except (IndexError, ValueError):
+        raise DrillPlanError(
+            "Ball {}: rate of fire is missing or not a number".format(ball_num))
+    if rof <= 0:
+        raise DrillPlanError(
+            "Ball {}: rate of fire {} s is not positive".format(ball_num, rof))
+
+    return rof
+
+
+def get_drill_shot_order(drill_info):
+    """Returns the shot order of a drill, which is kept in the row of its first ball
+
+    Args:
+        drill_info ([dict]): Drill information from get_profile_info ([shot location, ball speed, ROF, order, block size] keyed by ball number)
+
+    Raises:
+        DrillPlanError: If the shot order is unknown or the block size is not a number
+
+    Returns:
+        [tuple]: Shot order (one of SHOT_ORDERS), block size (None unless the shot order is "blocks")
+    """
+
+    ball_num, first_ball_info = next(iter(drill_info.items()))
+
+    # Drills made before the order columns existed run in CSV order
+    shot_order = "fixed"
+    if len(first_ball_info) > 3 and first_ball_info[3].strip():
+        shot_order = first_ball_info[3].strip().lower()
+    if shot_order not in SHOT_ORDERS:
+        raise DrillPlanError(
+            "Ball {}: unknown shot order '{}'".format(ball_num, shot_order))
+
+    block_size = None
+    if shot_order == "blocks":
+        try:
+            block_size = int(first_ball_info[4])
+        except (IndexError, ValueError):
+            raise DrillPlanError(
+                "Ball {}: shot order 'blocks' needs a block size".format(ball_num))
+
+    return shot_order, block_size
+
+
+def compile_drill_plan(drill_info, shot_angle_table, fmt, fmb, bfm, start_shot_loc=HOME_SHOT_LOC):
+    """Turns a whole drill into a list of DrillPlanSteps, so that any error in the drill surfaces before any motor is energized
+
+    Args:
+        drill_info ([dict]): Drill information from get_profile_info ([shot location, ball speed, ROF] keyed by ball number)
+        shot_angle_table ([dict]): Table from build_shot_angle_table
+        fmt ([MotorFlywheelTop]): Top flywheel motor
+        fmb ([MotorFlywheelBottom]): Bottom flywheel motor
+        bfm ([MotorBallFeed]): Ball feed motor
+        start_shot_loc ([str], optional): Shot location the machine is aimed at before the first ball. Defaults to HOME_SHOT_LOC.
+
+    Raises:
+        DrillPlanError: If the drill is empty, its ROF is invalid or any of its shots cannot be executed
+
+    Returns:
+        [list]: DrillPlanSteps in shooting order
+    """
+
+    rof = get_drill_rof(drill_info)
+
+    # The ROF itself is kept by rof_scheduler.RofScheduler while the drill runs. Every ball has the same feed stroke, so this is only checked once for the whole drill.
+    if rof < 2*bfm.stroke_time:
+        print("Rate of fire {} s is shorter than the feed stroke ({} s), so balls will be shot late".format(
+            rof, 2*bfm.stroke_time))
+
+    drill_plan = []
+    prev_shot_loc = start_shot_loc
+    for ball_num, each_ball_info in drill_info.items():
+        if len(each_ball_info) < 2:
+            raise DrillPlanError(
+                "Ball {}: shot location or ball speed is missing".format(ball_num))
+        drill_plan.append(compile_shot(
+            ball_num, prev_shot_loc, each_ball_info[0], each_ball_info[1], shot_angle_table, fmt, fmb, bfm))
+        prev_shot_loc = each_ball_info[0]
+
+    return drill_plan
+
+
+def get_shot_cost(prev_shot_loc, prev_duty_cycle, drill_plan_step, shot_angle_table, ym, pm):
+    """Estimates the total motion (in seconds of motor time) needed to go from one shot to another
+
+    Args:
+        prev_shot_loc ([str]): Shot location the machine is aimed at
+        prev_duty_cycle ([int]): Duty cycle the flywheels are spinning at
+        drill_plan_step ([DrillPlanStep]): Next shot
+        shot_angle_table ([dict]): Table from build_shot_angle_table
+        ym ([MotorYaw]): Yaw motor
+        pm ([MotorPitch]): Pitch motor
+
+    Returns:
+        [float]: Estimated travel time of both axes and the flywheels added up (in seconds)
+    """
+
+    shot_move = shot_angle_table[(prev_shot_loc, drill_plan_step.shot_loc)]
+
+    # The motors know how many coarse/fine enable pulses each move takes
+    yaw_time = ym.get_move_duration(shot_move.yaw_pulses)
+    pitch_time = pm.get_move_duration(shot_move.pitch_pulses)
+    # Spin-up time scales with how much the duty cycle changes
+    spin_up_time = FLYWHEEL_SPIN_UP_TIME * \
+        abs(drill_plan_step.top_duty_cycle - prev_duty_cycle)/100
+
+    # Every axis and the flywheel speed change count (not just the slowest one), so that the order keeps the total travel down
+    return yaw_time + pitch_time + spin_up_time
+
+
+def reorder_drill_plan(drill_plan, shot_angle_table, ym, pm, shot_order="any", block_size=None, start_shot_loc=HOME_SHOT_LOC, start_duty_cycle=0):
+    """Picks an execution order for an order-insensitive drill that keeps axis travel and flywheel speed changes to a minimum
+
+    NOTE: The same shots are executed, only their order changes. Within a block, the next shot is always the cheapest one to reach from the current one.
+
+    Args:
+        drill_plan ([list]): DrillPlanSteps from compile_drill_plan
+        shot_angle_table ([dict]): Table from build_shot_angle_table
+        ym ([MotorYaw]): Yaw motor
+        pm ([MotorPitch]): Pitch motor
+        shot_order ([str], optional): One of SHOT_ORDERS. Defaults to "any".
+        block_size ([int], optional): Number of balls per block when shot_order is "blocks". Defaults to None.
+        start_shot_loc ([str], optional): Shot location the machine is aimed at before the first ball. Defaults to HOME_SHOT_LOC.
+        start_duty_cycle ([int], optional): Duty cycle the flywheels spin at before the first ball. Defaults to 0.
+
+    Raises:
+        DrillPlanError: If the shot order is unknown or the block size is missing
+
+    Returns:
+        [list]: DrillPlanSteps in execution order, with their shot moves updated to the new order
+    """
+
+    if shot_order not in SHOT_ORDERS:
+        raise DrillPlanError("Unknown shot order '{}'".format(shot_order))
+
+    if shot_order == "fixed":
+        return list(drill_plan)
+
+    if shot_order == "any":
+        block_size = len(drill_plan)
+    elif block_size is None or block_size < 1:
+        raise DrillPlanError(
+            "Shot order 'blocks' needs a block size of at least 1")
+
+    reordered_plan = []
+    prev_shot_loc = start_shot_loc
+    prev_duty_cycle = start_duty_cycle
+    for block_start in range(0, len(drill_plan), max(block_size, 1)):
+        remaining_steps = list(drill_plan[block_start:block_start+block_size])
+        while remaining_steps:
+            # min() keeps CSV order between shots that cost the same
+            next_step = min(remaining_steps, key=lambda step: get_shot_cost(
+                prev_shot_loc, prev_duty_cycle, step, shot_angle_table, ym, pm))
+            remaining_steps.remove(next_step)
+
+            # The relative move depends on the shot before it, so it is looked up again for the new order
+            reordered_plan.append(next_step._replace(
+                shot_move=shot_angle_table[(prev_shot_loc, next_step.shot_loc)]))
+            prev_shot_loc = next_step.shot_loc
+            prev_duty_cycle = next_step.top_duty_cycle
+
+    return reordered_plan
@@ -0,0 +1,130 @@
+"""
+gpio_cache.py
+---
+This file contains the output state cache shared by all motor classes. It knows the level of every output pin and the duty cycle of every PWM channel, so that writes which would not change anything are skipped (and so are the HLFB waits they would have caused).
+---
+
+Author: Ball-E contributors
+Date: October 17, 2026
+Last Modified: October 17, 2026
+"""
+
+import threading
+
+import Jetson.GPIO as gpio
+
+# Last level written to each output pin, keyed by pin number
+pin_levels = dict()
+
+# Last duty cycle set on each PWM channel, keyed by pin number
+duty_cycles = dict()
+
+cache_lock = threading.Lock()
+
+
+def setup_outputs(channels, initial=gpio.LOW):
+    """Sets channels up as outputs and remembers their initial level
+
+    Args:
+        channels ([list]): Pin numbers
+        initial ([int], optional): Initial level. Defaults to gpio.LOW.
+    """
+
+    gpio.setup(channels, gpio.OUT, initial=initial)
+
+    with cache_lock:
+        for channel in channels:
+            pin_levels[channel] = initial
+
+
+def output(channel, level):
+    """Writes a level to an output pin unless the pin already has it
+
+    Args:
+        channel ([int]): Pin number
+        level ([int]): gpio.HIGH or gpio.LOW
+
+    Returns:
+        [bool]: True if the level was written, False if it was a no-op
+    """
+
+    with cache_lock:
+        if pin_levels.get(channel) == level:
+            return False
+        pin_levels[channel] = level
+
+    gpio.output(channel, level)
+    return True
+
+
+def get_level(channel):
+    """Returns the last level written to an output pin
+
+    Args:
+        channel ([int]): Pin number
+
+    Returns:
+        [int]: gpio.HIGH or gpio.LOW, or None if unknown
+    """
+    return pin_levels.get(channel)
+
+
+def get_duty_cycle(channel):
+    """Returns the last duty cycle set on a PWM channel
+
+    Args:
+        channel ([int]): Pin number of the channel
+
+    Returns:
+        [float]: Duty cycle (in %), or None if unknown
+    """
+    return duty_cycles.get(channel)
+
+
+def start_pwm(pwm, channel, duty_cycle):
+    """Starts a PWM channel and remembers its duty cycle
+
+    Args:
+        pwm ([gpio.PWM]): PWM object of the channel
+        channel ([int]): Pin number of the channel
+        duty_cycle ([float]): Initial duty cycle (in %)
+    """
+
+    pwm.start(duty_cycle)
+
+    with cache_lock:
+        duty_cycles[channel] = duty_cycle
+
+
+def change_duty_cycle(pwm, channel, duty_cycle):
+    """Changes the duty cycle of a PWM channel unless it already has it
+
+    Args:
+        pwm ([gpio.PWM]): PWM object of the channel
+        channel ([int]): Pin number of the channel
+        duty_cycle ([float]): Duty cycle (in %)
+
+    Returns:
+        [bool]: True if the duty cycle was changed, False if it was a no-op
+    """
+
+    with cache_lock:
+        if duty_cycles.get(channel) == duty_cycle:
+            return False
+        duty_cycles[channel] = duty_cycle
+
+    pwm.ChangeDutyCycle(duty_cycle)
+    return True
+
+
+def forget(channels):
+    """Forgets the state of channels (e.g.: once they have been cleaned up), so that the next write always goes through
+
+    Args:
+        channels ([list]): Pin numbers
+    """
+
+    with cache_lock:
+        for channel in channels:
+            pin_levels.pop(channel, None)
+            duty_cycles.pop(channel, None)
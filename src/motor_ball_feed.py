@@ -1,7 +1,7 @@
 """
 motor_ball_feed.py
 ---
-This file contains the MotorBallFeed class, which controls the Ball Feed Motor (BFM) using measured position values.
+This file contains the MotorBallFeed class, which controls the Ball Feed Motor (BFM) using measured position values. Each stroke can end on the HLFB ('Move Done') once it is wired to a pin.
 NOTE: Although this should be the version that is to be used, there was oversight on how this control mode did its homing routing which affected how the PCB was built. Hence, this is not the file being used in the current iteration of the project. The file being used is motor_ball_feed_vel.py.
 ---
 
@@ -14,6 +14,14 @@ import time
 
 import Jetson.GPIO as gpio
 
+import drill_cancel
+import gpio_cache
+import motor_calibration
+import motor_hlfb
+
+# "timed" gives each stroke a fixed time, "hlfb" ends each stroke as soon as the HLFB reports the move is done
+FEED_MODES = ["timed", "hlfb"]
+
 
 class MotorBallFeed:
     """The Ball Feed Motor will be controlled using the 'Move to Absolute Position (2-Position, Home to Switch)' Setting. As Teknik puts it, 'this mode was designed for replacing hydraulic or pneumatic cylinders that move between two positions'
@@ -39,7 +47,24 @@ class MotorBallFeed:
         # Enable pin set to low (unenergized)
         # Input A pin set to low (Position 1)
         self.bfm_channels = [self.en_pin, self.in_a_pin]
-        gpio.setup(self.bfm_channels, gpio.OUT, initial=gpio.LOW)
+        gpio_cache.setup_outputs(self.bfm_channels)
+
+        # HLFB pin number. None while the HLFB is wired to GND, in which case only the timed strokes can be used.
+        # NOTE: The HLFB has to be set to 'Move Done' (or 'In Range - Position') in ClearPath-MSP, which this positioning mode has and the velocity mode does not
+        self.hlfb_pin = None
+        self.hlfb = None
+        if self.hlfb_pin is not None:
+            # HLFB pin set as input
+            gpio.setup(self.hlfb_pin, gpio.IN)
+            # HLFB rising edges end the stroke that is waiting for them
+            self.hlfb = motor_hlfb.HlfbMonitor(
+                self.hlfb_pin, motor_name="bfm")
+
+        # How each stroke ends (see FEED_MODES)
+        self.feed_mode = "timed"
+
+        # How long (in seconds) energizing (which runs the homing routine) may take
+        self.energize_timeout = motor_hlfb.HLFB_TIMEOUT
 
         # This variable will track whether or not the motor is energized
         self.motor_on = False
@@ -47,34 +72,197 @@ class MotorBallFeed:
         # This variable will store the position of the motor (By default, it should be at pos. 1)
         self.bfm_pos = 1
 
-    def energize_motor(self):
-        """Turns the motor on
+        # This variable is how long one stroke (forward or backward) takes at most
+        # NOTE: Same constant as the velocity mode's stroke time, since it is the same mechanical stroke. HLFB strokes use it as their timeout.
+        self.stroke_time = motor_calibration.get_calibrated_value(
+            "bfm_stroke_time", 1.1)
+
+    def set_feed_mode(self, feed_mode):
+        """Selects how each stroke ends. The HLFB mode falls back to the timed mode if the HLFB is not wired to a pin.
+
+        Args:
+            feed_mode ([str]): One of FEED_MODES
+
+        Returns:
+            [str]: The feed mode that is used
+        """
+
+        if feed_mode not in FEED_MODES:
+            raise ValueError("Unknown feed mode '{}'".format(feed_mode))
+
+        if feed_mode == "hlfb" and self.hlfb is None:
+            print(
+                "BFM HLFB is not wired to a pin, so the timed strokes are used")
+            feed_mode = "timed"
+
+        self.feed_mode = feed_mode
+        return self.feed_mode
+
+    def energize_motor(self, block=True):
+        """Turns the motor on, which makes it run its homing routine
+
+        Args:
+            block ([bool], optional): Whether to block the thread until the HLFB reports the homing is done. Defaults to True.
+
+        Returns:
+            [MotorCompletion]: Done once the HLFB reports the homing is done (right away in the timed mode)
         """
+        # Already energized, so there is no HLFB edge to wait for
+        if gpio_cache.get_level(self.en_pin) == gpio.HIGH:
+            self.motor_on = True
+            return motor_hlfb.done_completion()
+
+        completion = motor_hlfb.done_completion()
+        if self.feed_mode == "hlfb":
+            # Armed before the motor is energized, so that the edge cannot be missed
+            completion = self.hlfb.arm(self.energize_timeout)
+
         # Set Enable pin to high to energize motor
-        gpio.output(self.en_pin, gpio.HIGH)
+        gpio_cache.output(self.en_pin, gpio.HIGH)
 
         # Motor is now energized
         self.motor_on = True
 
-    def move_forward(self):
+        if block:
+            completion.wait()
+
+        return completion
+
+    async def energize_motor_async(self):
+        """Async counterpart of energize_motor
+        """
+
+        completion = self.energize_motor(block=False)
+        await completion.wait_async()
+
+        return completion
+
+    def is_stroke_done(self, in_a_level):
+        """Returns whether the feed is already at the position an Input A level selects, so that there is no HLFB edge to wait for
+
+        Args:
+            in_a_level ([int]): Input A level that selects the position
+
+        Returns:
+            [bool]: True if the HLFB reports the move to that position is done, False otherwise (or in the timed mode, where this cannot be told)
+        """
+        return self.feed_mode == "hlfb" \
+            and gpio_cache.get_level(self.in_a_pin) == in_a_level \
+            and gpio.input(self.hlfb_pin) == gpio.HIGH
+
+    def run_stroke(self, in_a_level, en_time):
+        """Moves the feed to the position an Input A level selects and waits until the stroke is done
+
+        Args:
+            in_a_level ([int]): Input A level that selects the position
+            en_time ([float]): How long the stroke takes. In the HLFB mode, this is how long to wait for the HLFB at most.
+
+        Returns:
+            [bool]: True if the stroke was done, False if it was cut short by the drill being cancelled
+        """
+
+        # The motor only follows Input A while it is energized
+        self.energize_motor()
+
+        if self.is_stroke_done(in_a_level):
+            return True
+
+        if self.feed_mode == "hlfb":
+            # Armed before Input A changes, so that even a fast 'Move Done' edge cannot be missed
+            # NOTE: Not recoverable, so that a missed edge costs no more than a timed stroke (the feed carries on once en_time has passed whatever the recovery policy)
+            completion = self.hlfb.arm(
+                en_time, move_size="stroke", recoverable=False)
+            start_time = time.monotonic()
+            gpio_cache.output(self.in_a_pin, in_a_level)
+            # NOTE: A stroke whose HLFB times out (which the monitor reports) has taken the whole en_time, like a timed stroke
+            if completion.wait():
+                print("BFM stroke done after {:.3f} s".format(
+                    time.monotonic() - start_time))
+            return not drill_cancel.is_cancelled()
+
+        gpio_cache.output(self.in_a_pin, in_a_level)
+        return drill_cancel.sleep(en_time)
+
+    async def run_stroke_async(self, in_a_level, en_time):
+        """Async counterpart of run_stroke, which awaits the stroke instead of blocking the thread
+        """
+
+        await self.energize_motor_async()
+
+        if self.is_stroke_done(in_a_level):
+            return True
+
+        if self.feed_mode == "hlfb":
+            completion = self.hlfb.arm(
+                en_time, move_size="stroke", recoverable=False)
+            gpio_cache.output(self.in_a_pin, in_a_level)
+            await completion.wait_async()
+            return not drill_cancel.is_cancelled()
+
+        gpio_cache.output(self.in_a_pin, in_a_level)
+        return await drill_cancel.sleep_async(en_time)
+
+    def move_forward(self, en_time=None):
         """Feed moves forward (pos. 2)
+
+        Args:
+            en_time ([float], optional): How long the stroke takes. Defaults to self.stroke_time.
         """
 
+        if en_time is None:
+            en_time = self.stroke_time
+
         # Set Input A to high to move to position 2
-        gpio.output(self.in_a_pin, gpio.HIGH)
+        # NOTE: The motor finishes the move on its own even if the wait is cut short, so it still counts as pos. 2
+        self.run_stroke(gpio.HIGH, en_time)
 
         # Update the state of position variable
         self.bfm_pos = 2
 
-    def move_backward(self):
+    def move_backward(self, en_time=None):
         """Feed moves backward (pos. 1)
+
+        Args:
+            en_time ([float], optional): How long the stroke takes. Defaults to self.stroke_time.
         """
 
+        if en_time is None:
+            en_time = self.stroke_time
+
         # Set Input A to low to move to position 1
-        gpio.output(self.in_a_pin, gpio.LOW)
+        # NOTE: Cut short if the drill is cancelled, in which case the feed is not all the way back yet
+        stroke_done = self.run_stroke(gpio.LOW, en_time)
 
         # Update the state of position variable
-        self.bfm_pos = 1
+        if stroke_done:
+            self.bfm_pos = 1
+
+    async def move_forward_async(self, en_time=None):
+        """Async counterpart of move_forward, which awaits the stroke instead of sleeping
+        """
+
+        if en_time is None:
+            en_time = self.stroke_time
+
+        # Set Input A to high to move to position 2
+        await self.run_stroke_async(gpio.HIGH, en_time)
+
+        # Update the state of position variable
+        self.bfm_pos = 2
+
+    async def move_backward_async(self, en_time=None):
+        """Async counterpart of move_backward, which awaits the stroke instead of sleeping
+        """
+
+        if en_time is None:
+            en_time = self.stroke_time
+
+        # Set Input A to low to move to position 1
+        stroke_done = await self.run_stroke_async(gpio.LOW, en_time)
+
+        # Update the state of position variable
+        if stroke_done:
+            self.bfm_pos = 1
 
     def get_motor_state(self):
         """Returns whether or not the motor is energized
@@ -92,25 +280,60 @@ class MotorBallFeed:
         """
         return self.bfm_pos
 
-    def stop_and_reset_motor(self):
+    def stop_and_reset_motor(self, release=True):
         """Stops the motor and resets all previously set values to their default values
+
+        Args:
+            release ([bool], optional): Whether to also clean up the motor's channels. Sessions borrowing the motor from motor_context keep them set up. Defaults to True.
+        """
+
+        # If BF is in forward position, move backwards
+        if self.bfm_pos == 2:
+            self.move_backward()
+
+        self.deenergize_motor()
+        if release:
+            self.release_motor()
+
+    async def stop_and_reset_motor_async(self, release=True):
+        """Async counterpart of stop_and_reset_motor
+        """
+
+        # If BF is in forward position, move backwards
+        if self.bfm_pos == 2:
+            await self.move_backward_async()
+
+        self.deenergize_motor()
+        if release:
+            self.release_motor()
+
+    def deenergize_motor(self):
+        """Unenergizes the motor once the feed is back, keeping its channels set up so that it can be used again
         """
 
         # Set Input A to low to move to position 1
-        gpio.output(self.in_a_pin, gpio.LOW)
+        gpio_cache.output(self.in_a_pin, gpio.LOW)
 
         # Unenergize the motor
-        gpio.output(self.en_pin, gpio.LOW)
+        gpio_cache.output(self.en_pin, gpio.LOW)
 
         # Update the state of position variable
         self.bfm_pos = 1
 
+        # Motor is not energized
+        self.motor_on = False
+
+    def release_motor(self):
+        """Cleans up the motor's channels once it has been unenergized (e.g.: at application exit)
+        """
+
         # Clean all BFM-related channels
         # NOTE: Doing this means the pins have been set to their default state, and init method needs to be called again to make this motor work
         gpio.cleanup(self.bfm_channels)
-
-        # Motor is not energized
-        self.motor_on = False
+        gpio_cache.forget(self.bfm_channels)
+        if self.hlfb is not None:
+            self.hlfb.stop()
+            gpio.cleanup(self.hlfb_pin)
 
 
 def main():
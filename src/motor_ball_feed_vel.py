@@ -14,6 +14,13 @@ import time
 
 import Jetson.GPIO as gpio
 
+import drill_cancel
+import gpio_cache
+import motor_calibration
+
+# "timed" energizes each stroke for a fixed time, "hlfb" ends each stroke as soon as the HLFB reports the move is done (only motor_ball_feed.py can)
+FEED_MODES = ["timed", "hlfb"]
+
 
 class MotorBallFeed:
     """The Ball Feed Motor will be controlled using the 'Ramp Up/Down to Selected Velocity' Setting.
@@ -43,7 +50,13 @@ class MotorBallFeed:
         # Enable pin set to low (unenergized)
         # Input A pin set to low (Position 1)
         self.bfm_channels = [self.en_pin, self.in_a_pin]
-        gpio.setup(self.bfm_channels, gpio.OUT, initial=gpio.LOW)
+        gpio_cache.setup_outputs(self.bfm_channels)
+
+        # NOTE: 'Move Done' and 'In Range - Position' are HLFB outputs of the positioning modes. This velocity mode has no HLFB output that marks the end of a stroke, so its strokes are always timed (motor_ball_feed.py has the HLFB strokes).
+        self.hlfb = None
+
+        # How each stroke ends (see FEED_MODES)
+        self.feed_mode = "timed"
 
         # This variable will track whether or not the motor is energized
         self.motor_on = False
@@ -51,48 +64,146 @@ class MotorBallFeed:
         # This variable will store the position of the motor (By default, it should be at pos. 1)
         self.bfm_pos = 1
 
+        # This variable is how long one stroke (forward or backward) is energized for
+        # NOTE: 1.1 s has been measured to work for the current iteration of the ball feed mechanical design, unless this machine has been calibrated
+        self.stroke_time = motor_calibration.get_calibrated_value(
+            "bfm_stroke_time", 1.1)
+
+    def set_feed_mode(self, feed_mode):
+        """Selects how each stroke ends. The HLFB mode falls back to the timed mode, since this velocity mode has no HLFB output for it.
+
+        Args:
+            feed_mode ([str]): One of FEED_MODES
+
+        Returns:
+            [str]: The feed mode that is used
+        """
+
+        if feed_mode not in FEED_MODES:
+            raise ValueError("Unknown feed mode '{}'".format(feed_mode))
+
+        if feed_mode == "hlfb":
+            print(
+                "BFM velocity mode has no 'Move Done' HLFB output, so the timed strokes are used")
+            feed_mode = "timed"
+
+        self.feed_mode = feed_mode
+        return self.feed_mode
+
+    def run_stroke(self, in_a_level, en_time):
+        """Energizes the motor for one stroke until it is done
+
+        Args:
+            in_a_level ([int]): Input A level that selects the stroke's direction
+            en_time ([float]): How long to energize the motor for
+
+        Returns:
+            [bool]: True if the stroke was done, False if it was cut short by the drill being cancelled
+        """
+
+        # Set Input A to select the direction
+        gpio_cache.output(self.in_a_pin, in_a_level)
+        # Set Enable pin to high to energize motor
+        gpio_cache.output(self.en_pin, gpio.HIGH)
+
+        stroke_done = drill_cancel.sleep(en_time)
+
+        # Set Enable pin to low to stop energizing motor
+        gpio_cache.output(self.en_pin, gpio.LOW)
+
+        return stroke_done
+
+    async def run_stroke_async(self, in_a_level, en_time):
+        """Async counterpart of run_stroke, which awaits the stroke instead of blocking the thread
+        """
+
+        # Set Input A to select the direction
+        gpio_cache.output(self.in_a_pin, in_a_level)
+        # Set Enable pin to high to energize motor
+        gpio_cache.output(self.en_pin, gpio.HIGH)
+
+        stroke_done = await drill_cancel.sleep_async(en_time)
+
+        # Set Enable pin to low to stop energizing motor
+        gpio_cache.output(self.en_pin, gpio.LOW)
+
+        return stroke_done
+
     def energize_motor(self):
         """Turns the motor on
         """
         # Set Enable pin to high to energize motor
-        gpio.output(self.en_pin, gpio.HIGH)
+        gpio_cache.output(self.en_pin, gpio.HIGH)
 
         # Motor is now energized
         self.motor_on = True
 
-    def move_forward(self, en_time=1.1):
+    async def energize_motor_async(self):
+        """Async counterpart of energize_motor
+        """
+        self.energize_motor()
+
+    def move_forward(self, en_time=None):
         """Feed moves forward (pos. 2)
 
-        NOTE: en_time has been measured to work for the current iteration of the ball feed mechanical design
+        Args:
+            en_time ([float], optional): How long to energize the motor for. Defaults to self.stroke_time.
         """
 
+        if en_time is None:
+            en_time = self.stroke_time
+
         # Set Input A to high to move to position 2
-        gpio.output(self.in_a_pin, gpio.HIGH)
-        # Set Enable pin to high to energize motor
-        gpio.output(self.en_pin, gpio.HIGH)
-        time.sleep(en_time)
-        # Set Enable pin to low to stop energizing motor
-        gpio.output(self.en_pin, gpio.LOW)
+        # NOTE: Cut short if the drill is cancelled. The feed is then somewhere forward, so it still counts as pos. 2.
+        self.run_stroke(gpio.HIGH, en_time)
 
         # Update the state of position variable
         self.bfm_pos = 2
 
-    def move_backward(self, en_time=1.1):
+    def move_backward(self, en_time=None):
         """Feed moves backward (pos. 1)
 
-        NOTE: en_time has been measured to work for the current iteration of the ball feed mechanical design
+        Args:
+            en_time ([float], optional): How long to energize the motor for. Defaults to self.stroke_time.
         """
 
+        if en_time is None:
+            en_time = self.stroke_time
+
+        # Set Input A to low to move to position 1
+        # NOTE: Cut short if the drill is cancelled, in which case the feed is not all the way back yet
+        stroke_done = self.run_stroke(gpio.LOW, en_time)
+
+        # Update the state of position variable
+        if stroke_done:
+            self.bfm_pos = 1
+
+    async def move_forward_async(self, en_time=None):
+        """Async counterpart of move_forward, which awaits the stroke instead of sleeping
+        """
+
+        if en_time is None:
+            en_time = self.stroke_time
+
         # Set Input A to high to move to position 2
-        gpio.output(self.in_a_pin, gpio.LOW)
-        # Set Enable pin to high to energize motor
-        gpio.output(self.en_pin, gpio.HIGH)
-        time.sleep(en_time)
-        # Set Enable pin to low to stop energizing motor
-        gpio.output(self.en_pin, gpio.LOW)
+        await self.run_stroke_async(gpio.HIGH, en_time)
 
         # Update the state of position variable
-        self.bfm_pos = 1
+        self.bfm_pos = 2
+
+    async def move_backward_async(self, en_time=None):
+        """Async counterpart of move_backward, which awaits the stroke instead of sleeping
+        """
+
+        if en_time is None:
+            en_time = self.stroke_time
+
+        # Set Input A to low to move to position 1
+        stroke_done = await self.run_stroke_async(gpio.LOW, en_time)
+
+        # Update the state of position variable
+        if stroke_done:
+            self.bfm_pos = 1
 
     def get_motor_state(self):
         """Returns whether or not the motor is energized
@@ -110,26 +221,54 @@ class MotorBallFeed:
         """
         return self.bfm_pos
 
-    def stop_and_reset_motor(self):
+    def stop_and_reset_motor(self, release=True):
         """Stops the motor and resets all previously set values to their default values
+
+        Args:
+            release ([bool], optional): Whether to also clean up the motor's channels. Sessions borrowing the motor from motor_context keep them set up. Defaults to True.
         """
 
         # # If BF is in forward position, move backwards
         if self.bfm_pos == 2:
             self.move_backward()
 
+        self.deenergize_motor()
+        if release:
+            self.release_motor()
+
+    async def stop_and_reset_motor_async(self, release=True):
+        """Async counterpart of stop_and_reset_motor
+        """
+
+        # If BF is in forward position, move backwards
+        if self.bfm_pos == 2:
+            await self.move_backward_async()
+
+        self.deenergize_motor()
+        if release:
+            self.release_motor()
+
+    def deenergize_motor(self):
+        """Unenergizes the motor once the feed is back, keeping its channels set up so that it can be used again
+        """
+
         # Unenergize the motor
-        gpio.output(self.en_pin, gpio.LOW)
+        gpio_cache.output(self.en_pin, gpio.LOW)
 
         # Update the state of position variable
         self.bfm_pos = 1
 
+        # Motor is not energized
+        self.motor_on = False
+
+    def release_motor(self):
+        """Cleans up the motor's channels once it has been unenergized (e.g.: at application exit)
+        """
+
         # Clean all BFM-related channels
         # NOTE: Doing this means the pins have been set to their default state, and init method needs to be called again to make this motor work
         gpio.cleanup(self.bfm_channels)
-
-        # Motor is not energized
-        self.motor_on = False
+        gpio_cache.forget(self.bfm_channels)
 
 
 def main():
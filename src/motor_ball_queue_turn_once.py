@@ -14,6 +14,11 @@ import time
 
 import Jetson.GPIO as gpio
 
+import drill_cancel
+import gpio_cache
+import motor_calibration
+import motor_hlfb
+
 
 class MotorBallQueue:
     """The BQM Motor will be controlled using the 'Move to Incremental Distance (1 Distance, Home To Switch)' Setting. As Teknik puts it,
@@ -39,28 +44,77 @@ class MotorBallQueue:
         # Enable pin set to low (unenergized)
         # Input A pin set to low (Position 1)
         self.bqm_channels = [self.en_pin, self.in_a_pin]
-        gpio.setup(self.bqm_channels, gpio.OUT, initial=gpio.LOW)
+        gpio_cache.setup_outputs(self.bqm_channels)
 
         # This variable will track whether or not the motor is energized
         self.motor_on = False
 
-    def energize_motor(self):
+        # How long (in seconds) the motor takes to be ready once energized
+        # NOTE: The BQM's HLFB is not wired to its own pin, so this cannot be confirmed and has to be tuned on the machine
+        self.energize_time = 0.5
+
+        # How long (in seconds) Input A is held high for one turn (0.5 s unless this machine has been calibrated)
+        self.turn_time = motor_calibration.get_calibrated_value(
+            "bqm_turn_time", 0.5)
+
+    def energize_motor(self, block=True):
         """Turns the motor on
+
+        Args:
+            block ([bool], optional): Whether to block the thread until the motor is ready. Defaults to True.
+
+        Returns:
+            [MotorCompletion]: Done once energize_time has passed
         """
+        # Already energized, so there is nothing to wait for
+        if gpio_cache.get_level(self.en_pin) == gpio.HIGH:
+            self.motor_on = True
+            return motor_hlfb.done_completion()
+
         # Set Enable pin to high to energize motor
-        gpio.output(self.en_pin, gpio.HIGH)
+        gpio_cache.output(self.en_pin, gpio.HIGH)
 
         # Motor is now energized
         self.motor_on = True
 
+        # There is no HLFB to wait for, so the motor is taken to be ready after energize_time
+        completion = motor_hlfb.MotorCompletion()
+        motor_hlfb.timeout_watchdog.schedule(
+            self.energize_time, completion.set_done)
+
+        if block:
+            completion.wait()
+
+        return completion
+
+    async def energize_motor_async(self):
+        """Async counterpart of energize_motor
+        """
+
+        completion = self.energize_motor(block=False)
+        await completion.wait_async()
+
+        return completion
+
     def turn_once(self):
         """BQM turns a rotation which allows one ball to fall
+
+        NOTE: The queue starts turning (and the ball can drop) as soon as Input A goes high, so the ball feed must already be back in pos. 1
         """
 
         # Set Input A to high to move
-        gpio.output(self.in_a_pin, gpio.HIGH)
-        time.sleep(0.5)
-        gpio.output(self.in_a_pin, gpio.LOW)
+        gpio_cache.output(self.in_a_pin, gpio.HIGH)
+        drill_cancel.sleep(self.turn_time)
+        gpio_cache.output(self.in_a_pin, gpio.LOW)
+
+    async def turn_once_async(self):
+        """Async counterpart of turn_once, which awaits the Input A pulse instead of blocking the thread
+        """
+
+        # Set Input A to high to move
+        gpio_cache.output(self.in_a_pin, gpio.HIGH)
+        await drill_cancel.sleep_async(self.turn_time)
+        gpio_cache.output(self.in_a_pin, gpio.LOW)
 
     def get_motor_state(self):
         """Returns whether or not the motor is energized
@@ -69,22 +123,43 @@ class MotorBallQueue:
         """
         return self.motor_on
 
-    def stop_and_reset_motor(self):
+    def stop_and_reset_motor(self, release=True):
         """Stops the motor and resets all previously set values to their default values
+
+        Args:
+            release ([bool], optional): Whether to also clean up the motor's channels. Sessions borrowing the motor from motor_context keep them set up. Defaults to True.
+        """
+
+        self.deenergize_motor()
+        if release:
+            self.release_motor()
+
+    async def stop_and_reset_motor_async(self, release=True):
+        """Async counterpart of stop_and_reset_motor
+        """
+        self.stop_and_reset_motor(release)
+
+    def deenergize_motor(self):
+        """Unenergizes the motor, keeping its channels set up so that it can be energized again
         """
 
         # Set Input A to low to move to position 1
-        gpio.output(self.in_a_pin, gpio.LOW)
+        gpio_cache.output(self.in_a_pin, gpio.LOW)
 
         # Turn off motor
-        gpio.output(self.en_pin, gpio.LOW)
+        gpio_cache.output(self.en_pin, gpio.LOW)
+
+        # Motor is not energized
+        self.motor_on = False
+
+    def release_motor(self):
+        """Cleans up the motor's channels once it has been unenergized (e.g.: at application exit)
+        """
 
         # Clean all BQM-related channels
         # NOTE: Doing this means the pins have been set to their default state, and init method needs to be called again to make this motor work
         gpio.cleanup(self.bqm_channels)
-
-        # Motor is not energized
-        self.motor_on = False
+        gpio_cache.forget(self.bqm_channels)
 
 
 def main():
@@ -0,0 +1,65 @@
+"""
+motor_bring_up.py
+---
+This file contains the motor bring-up, which energizes independent motors at the same time and finishes as soon as every motor reports it is ready, instead of energizing them one after another and sleeping a fixed amount.
+---
+
+Author: Ball-E contributors
+Date: October 17, 2026
+Last Modified: October 17, 2026
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+import motor_hlfb
+
+# One motor to bring up
+# energize: Function that energizes the motor. It may block, and it may return a MotorCompletion that is done once the motor is ready.
+# dependencies: Names of the motors that must be ready before this one is energized
+# timeout: How long (in seconds) to wait for the motor to be ready (None waits for the completion's own deadline)
+BringUpStep = namedtuple(
+    "BringUpStep", ["motor_name", "energize", "dependencies", "timeout"])
+
+
+def bring_up_motors(bring_up_steps):
+    """Energizes every motor on its own thread as soon as the motors it depends on are ready, and returns once all of them are ready or have timed out
+
+    Args:
+        bring_up_steps ([list]): BringUpSteps. Dependencies must come earlier in the list.
+
+    Returns:
+        [dict]: Whether each motor reported it is ready, keyed by motor name
+    """
+
+    start_time = time.monotonic()
+    step_completions = dict()
+    motor_ready = dict()
+
+    for bring_up_step in bring_up_steps:
+        step_done = motor_hlfb.MotorCompletion()
+        dependencies_done = motor_hlfb.combine_completions(
+            [step_completions[motor_name] for motor_name in bring_up_step.dependencies])
+
+        def run_step(bring_up_step=bring_up_step, step_done=step_done):
+            try:
+                completion = bring_up_step.energize()
+                ready = True
+                if isinstance(completion, motor_hlfb.MotorCompletion):
+                    ready = completion.wait(bring_up_step.timeout)
+                motor_ready[bring_up_step.motor_name] = ready
+                print("{} {} after {:.3f} s".format(bring_up_step.motor_name, "ready" if ready else "NOT ready",
+                                                    time.monotonic() - start_time))
+            finally:
+                # A motor that timed out does not hold the others back any longer than its timeout
+                step_done.set_done()
+
+        dependencies_done.add_done_callback(lambda _, run_step=run_step: threading.Thread(
+            target=run_step, daemon=True).start())
+        step_completions[bring_up_step.motor_name] = step_done
+
+    motor_hlfb.combine_completions(
+        list(step_completions.values())).wait(cancellable=False)
+
+    return motor_ready
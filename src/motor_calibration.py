@@ -0,0 +1,245 @@
+"""
+motor_calibration.py
+---
+This file contains the per-machine calibration of the timing constants that decide throughput (feed stroke time, enable pulse width and queue dwell). The motor classes load the calibrated values at startup, and the autotuner sweeps each constant down to the smallest value that still works on this machine.
+---
+
+Author: Ball-E contributors
+Date: October 17, 2026
+Last Modified: October 17, 2026
+"""
+
+import csv
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+# Each machine keeps its own calibration next to its drill and goalie profiles
+CALIBRATION_PATH = str(Path.home()) + \
+    "/Documents/ball_e_profiles/machine_calibration.csv"
+
+# One timing constant to calibrate
+# motor_name: Name of the motor (as in MotorContext.get_motors) the constant belongs to
+# attribute: Name of the motor's attribute that holds the constant
+# min_value: Smallest value the sweep tries
+# step: How much (in seconds) the sweep takes off the constant each time
+# trial: Function that runs one trial with the motor and returns whether its HLFB (if any) confirmed it
+# question: What the operator is asked once all trials at a value are done (formatted with the value)
+CalibrationConstant = namedtuple("CalibrationConstant", [
+    "name", "motor_name", "attribute", "min_value", "step", "trial", "question"])
+
+# Calibrated values read from CALIBRATION_PATH, keyed by constant name (None until first loaded)
+calibrated_values = None
+calibrated_values_lock = threading.Lock()
+
+
+def load_calibration():
+    """Reads the calibration file once. A machine that has not been calibrated yet has no file, in which case the motors keep their measured defaults.
+
+    Returns:
+        [dict]: Calibrated values keyed by constant name
+    """
+
+    global calibrated_values
+
+    with calibrated_values_lock:
+        if calibrated_values is None:
+            calibrated_values = dict()
+            try:
+                with open(CALIBRATION_PATH) as file:
+                    csv_reader = csv.reader(file, delimiter=',')
+                    # Skip the header
+                    next(csv_reader, None)
+                    for row in csv_reader:
+                        calibrated_values[row[0]] = float(row[1])
+            except FileNotFoundError:
+                print("No calibration at {}, using the default timings".format(
+                    CALIBRATION_PATH))
+
+        return calibrated_values
+
+
+def get_calibrated_value(name, default):
+    """Returns the calibrated value of a constant
+
+    Args:
+        name ([str]): Name of the constant (e.g.: "bfm_stroke_time")
+        default ([float]): Value to use if the constant has not been calibrated
+
+    Returns:
+        [float]: Calibrated value, or default
+    """
+    return load_calibration().get(name, default)
+
+
+def save_calibration(values):
+    """Writes calibrated values to the calibration file, keeping the values of constants that were not calibrated this time
+
+    Args:
+        values ([dict]): Calibrated values keyed by constant name
+    """
+
+    all_values = dict(load_calibration())
+    all_values.update(values)
+
+    Path(CALIBRATION_PATH).parent.mkdir(parents=True, exist_ok=True)
+    with open(CALIBRATION_PATH, 'w', newline='') as file:
+        csv_writer = csv.writer(file, delimiter=",")
+        csv_writer.writerow(["Constant", "Value"])
+        for name, value in sorted(all_values.items()):
+            csv_writer.writerow([name, value])
+
+    with calibrated_values_lock:
+        calibrated_values.update(values)
+
+
+def set_motor_value(motor, calibration_constant, value):
+    """Applies a value of a constant to a motor that is already set up
+
+    Args:
+        motor ([object]): Motor the constant belongs to
+        calibration_constant ([CalibrationConstant]): Constant to set
+        value ([float]): Value in seconds
+    """
+
+    setattr(motor, calibration_constant.attribute, value)
+
+    # NOTE: The yaw and pitch pulse trains keep their own copy of the enable pulse width
+    if calibration_constant.attribute == "en_trig_time":
+        motor.pulse_train.pulse_low_time = value
+
+
+def feed_trial(bfm):
+    """Strokes the feed forward and back (there is nothing for the HLFB to confirm in the timed feed mode)
+    """
+
+    bfm.move_forward()
+    bfm.move_backward()
+    return True
+
+
+def queue_trial(bqm):
+    """Turns the queue once (the BQM's HLFB is not wired to a pin)
+    """
+
+    bqm.turn_once()
+    return True
+
+
+def axis_trial(target_encoder_count):
+    """Returns a trial that moves an axis out to an encoder count and back to center, which passes if the HLFB confirms both moves
+    """
+
+    def trial(motor):
+        return motor.move_to(target_encoder_count).is_done() and motor.move_to(0).is_done()
+
+    return trial
+
+
+CALIBRATION_CONSTANTS = [
+    CalibrationConstant("bfm_stroke_time", "bfm", "stroke_time", 0.3, 0.05, feed_trial,
+                        "Did the feed go all the way forward and all the way back every time at {} s?"),
+    CalibrationConstant("ym_en_trig_time", "ym", "en_trig_time", 0.002, 0.002, axis_trial(10),
+                        "Is the yaw back at center (no missed steps) at {} s pulses?"),
+    CalibrationConstant("pm_en_trig_time", "pm", "en_trig_time", 0.002, 0.002, axis_trial(4),
+                        "Is the pitch back at center (no missed steps) at {} s pulses?"),
+    CalibrationConstant("bqm_turn_time", "bqm", "turn_time", 0.1, 0.05, queue_trial,
+                        "Did exactly one ball drop every time at {} s?"),
+]
+
+
+def confirm_in_console(question):
+    """Asks the operator a yes/no question in the console
+
+    Args:
+        question ([str]): Question to ask
+
+    Returns:
+        [bool]: True if the operator answered yes, False otherwise
+    """
+    return input("{} [y/n] ".format(question)).strip().lower().startswith("y")
+
+
+def calibrate_constant(motor, calibration_constant, confirm, trials):
+    """Sweeps a constant down from the motor's current value, one step at a time, until a value fails. Each value must pass all trials (HLFB) and the operator's confirmation.
+
+    Args:
+        motor ([object]): Energized motor the constant belongs to
+        calibration_constant ([CalibrationConstant]): Constant to calibrate
+        confirm ([function]): Asks the operator a question and returns whether they confirmed it
+        trials ([int]): Number of trials at each value
+
+    Returns:
+        [float]: Smallest value that passed (the motor is left at this value)
+    """
+
+    reliable_value = getattr(motor, calibration_constant.attribute)
+    value = reliable_value
+
+    # NOTE: Rounded, so that floating point steps do not skip the minimum or end up in the file as 0.30000000000000004
+    while round(value - calibration_constant.step, 4) >= calibration_constant.min_value:
+        value = round(value - calibration_constant.step, 4)
+        set_motor_value(motor, calibration_constant, value)
+
+        passed = all(calibration_constant.trial(motor) for _ in range(trials))
+        if passed:
+            passed = confirm(calibration_constant.question.format(value))
+        print("{} = {}: {}".format(calibration_constant.name,
+                                   value, "passed" if passed else "FAILED"))
+        if not passed:
+            break
+        reliable_value = value
+
+    set_motor_value(motor, calibration_constant, reliable_value)
+    return reliable_value
+
+
+def run_calibration(motors, confirm=confirm_in_console, trials=3, constant_names=None):
+    """Calibrates the timing constants of this machine and saves them to the calibration file. The motors must already be energized.
+
+    Args:
+        motors ([dict]): Motors keyed by name (e.g.: MotorContext.get_motors())
+        confirm ([function], optional): Asks the operator a question and returns whether they confirmed it. Defaults to confirm_in_console.
+        trials ([int], optional): Number of trials at each value. Defaults to 3.
+        constant_names ([list], optional): Names of the constants to calibrate. Defaults to None (all of them).
+
+    Returns:
+        [dict]: Calibrated values keyed by constant name
+    """
+
+    values = dict()
+    for calibration_constant in CALIBRATION_CONSTANTS:
+        if constant_names is not None and calibration_constant.name not in constant_names:
+            continue
+        values[calibration_constant.name] = calibrate_constant(
+            motors[calibration_constant.motor_name], calibration_constant, confirm, trials)
+
+    save_calibration(values)
+    print("Calibration saved to {}: {}".format(CALIBRATION_PATH, values))
+
+    return values
+
+
+def main():
+    """main.
+
+    Main prototype/testing area. Code prototyping and checking happens here.
+    """
+
+    # Imported here since the motor classes import this module
+    import motor_context
+    import motor_shutdown
+
+    motors = motor_context.get_motor_context().get_motors()
+    # NOTE: BFM is not energized since it will cause motor to move (its strokes energize it themselves)
+    for motor_name in ["ym", "pm", "bqm"]:
+        motors[motor_name].energize_motor()
+
+    run_calibration(motors)
+
+    motor_shutdown.shut_down_motors(motors)
+
+
+if __name__ == "__main__":
+    # Run the main function
+    main()
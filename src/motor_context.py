@@ -0,0 +1,88 @@
+"""
+motor_context.py
+---
+This file contains the MotorContext class, which owns the six motors (their pin setup, PWM objects, HLFB monitors and pulse train threads) for the whole process. Drill sessions borrow the motors instead of setting the pins up again, and the channels are only cleaned up once, at application exit.
+---
+
+Author: Ball-E contributors
+Date: October 17, 2026
+Last Modified: October 17, 2026
+"""
+
+import atexit
+import threading
+
+import motor_ball_feed_vel
+import motor_ball_queue_turn_once
+import motor_flywheel_bottom
+import motor_flywheel_top
+import motor_pitch
+import motor_yaw
+
+# Driver of the BFM, which has to match how the motor is set up in ClearPath-MSP
+# NOTE: The current machine uses the velocity mode (motor_ball_feed_vel). The 2-position mode (motor_ball_feed, which has to be imported to be used here) is the one whose HLFB can report that a feed stroke is done, which the "hlfb" feed mode needs.
+BALL_FEED_DRIVER = motor_ball_feed_vel
+
+# GPIO pins the yaw and pitch motors' Input B are wired to, which enables their coarse distances
+# NOTE: Both are wired to GND on the current PCB (None), so only the fine distances are used
+YM_IN_B_PIN = None
+PM_IN_B_PIN = None
+
+# The process-wide context, created by the first session that asks for it
+motor_context = None
+motor_context_lock = threading.Lock()
+
+
+class MotorContext:
+    """Sets up all motors once and keeps them set up until release is called
+    """
+
+    def __init__(self):
+        """Initializes all motors
+        """
+
+        self.bfm = BALL_FEED_DRIVER.MotorBallFeed()
+        self.bqm = motor_ball_queue_turn_once.MotorBallQueue()
+        self.fmt = motor_flywheel_top.MotorFlywheelTop()
+        self.fmb = motor_flywheel_bottom.MotorFlywheelBottom()
+        self.pm = motor_pitch.MotorPitch(PM_IN_B_PIN)
+        self.ym = motor_yaw.MotorYaw(YM_IN_B_PIN)
+
+        # Whether the channels have been cleaned up
+        self.released = False
+
+    def get_motors(self):
+        """Returns all motors keyed by the names the session handler uses for them
+
+        Returns:
+            [dict]: Motors keyed by name
+        """
+        return {"bfm": self.bfm, "bqm": self.bqm, "fmt": self.fmt, "fmb": self.fmb, "ym": self.ym, "pm": self.pm}
+
+    def release(self):
+        """Cleans up the channels of all motors. Sessions must have stopped (and reset) the motors before this is called.
+        """
+
+        if self.released:
+            return
+        self.released = True
+
+        for motor in self.get_motors().values():
+            motor.release_motor()
+
+
+def get_motor_context():
+    """Returns the process-wide motor context, setting the motors up the first time it is called. The context is released when the application exits.
+
+    Returns:
+        [MotorContext]: The motor context
+    """
+
+    global motor_context
+
+    with motor_context_lock:
+        if motor_context is None:
+            motor_context = MotorContext()
+            atexit.register(motor_context.release)
+
+    return motor_context
@@ -14,6 +14,9 @@ import time
 
 import Jetson.GPIO as gpio
 
+import gpio_cache
+import motor_hlfb
+
 
 class MotorFlywheelBottom:
     """The Bottom Flywheel Motor will be controlled using the 'Unipolar PWM command'. This motor will be running clockwise.
@@ -53,31 +56,71 @@ class MotorFlywheelBottom:
         # Input B pin set to low
         # HLFB pin set as input
         self.fbm_out_channels = [self.en_pin, self.in_b_pin]
-        gpio.setup(self.fbm_out_channels, gpio.OUT, initial=gpio.LOW)
+        gpio_cache.setup_outputs(self.fbm_out_channels)
         gpio.setup(self.hlfb_pin, gpio.IN)
 
+        # HLFB rising edges complete the command that is waiting for them
+        self.hlfb = motor_hlfb.HlfbMonitor(
+            self.hlfb_pin, motor_name="fmb")
+
+        # How long (in seconds) energizing waits for the HLFB to report the motor is ready
+        self.energize_timeout = motor_hlfb.HLFB_TIMEOUT
+
         # Initialize PWM w/ frequency
         self.pwm = gpio.PWM(self.in_b_pin, self.pwm_freq)
         # Start PWM at 0% Duty Cycle
-        self.pwm.start(0)
+        gpio_cache.start_pwm(self.pwm, self.in_b_pin, 0)
 
         # This variable will track whether or not the motor is energized
         self.motor_on = False
 
-    def energize_motor(self):
+    def energize_motor(self, block=True):
         """Turns the motor on
+
+        Args:
+            block ([bool], optional): Whether to block the thread until the HLFB reports the motor is ready. Defaults to True.
+
+        Returns:
+            [MotorCompletion]: Done once the HLFB reports the motor is ready
         """
+        # Already energized, so there is no HLFB edge to wait for
+        if gpio_cache.get_level(self.en_pin) == gpio.HIGH:
+            self.motor_on = True
+            return motor_hlfb.done_completion()
+
+        # The HLFB goes high once the motor is enabled and ready
+        completion = self.hlfb.arm(self.energize_timeout)
+
         # Set Enable pin to high to energize motor
-        gpio.output(self.en_pin, gpio.HIGH)
+        gpio_cache.output(self.en_pin, gpio.HIGH)
 
         # Motor is now energized
         self.motor_on = True
 
-    def set_speed(self, desired_speed):
-        """Set the speed of the motor
+        if block:
+            completion.wait()
+
+        return completion
+
+    async def energize_motor_async(self):
+        """Async counterpart of energize_motor
+        """
+
+        completion = self.energize_motor(block=False)
+
+        # Await the rising edge OR the timeout (whichever is first)
+        await completion.wait_async()
+
+        return completion
+
+    def speed_to_duty_cycle(self, desired_speed):
+        """Converts a ball speed to the PWM duty cycle that drives the motor at it
 
         Args:
-            desired_speed ([int]): The speed for the top flywheel motor (in MPH)
+            desired_speed ([int]): The speed for the bottom flywheel motor (in MPH)
+
+        Returns:
+            [int]: Duty cycle (in %)
         """
 
         inch_per_mile = 63360
@@ -90,13 +133,66 @@ class MotorFlywheelBottom:
         # Find out how much percentage that RPM is to the max RPM of the motor
         req_duty_cycle = int((desired_rpm/self.fm_max_rpm)*100)
 
+        return req_duty_cycle
+
+    def set_speed(self, desired_speed, block=True):
+        """Set the speed of the motor
+
+        Args:
+            desired_speed ([int]): The speed for the bottom flywheel motor (in MPH)
+            block ([bool], optional): Whether to block the thread until the HLFB confirms the speed. Defaults to True.
+
+        Returns:
+            [MotorCompletion]: Done once the HLFB confirms the speed
+        """
+
+        return self.set_duty_cycle(self.speed_to_duty_cycle(desired_speed), block)
+
+    def set_duty_cycle(self, req_duty_cycle, block=True):
+        """Set the speed of the motor using an already calculated duty cycle
+
+        Args:
+            req_duty_cycle ([int]): Duty cycle (in %) from speed_to_duty_cycle
+            block ([bool], optional): Whether to block the thread until the HLFB confirms the speed. Defaults to True.
+
+        Returns:
+            [MotorCompletion]: Done once the HLFB confirms the speed
+        """
+
+        # How far the speed changes decides how long the HLFB takes to confirm it
+        prev_duty_cycle = gpio_cache.get_duty_cycle(self.in_b_pin) or 0
+
         # Change duty cycle to that percentage
-        self.pwm.ChangeDutyCycle(req_duty_cycle)
+        if not gpio_cache.change_duty_cycle(self.pwm, self.in_b_pin, req_duty_cycle):
+            # Already at that duty cycle, so the speed does not change and there is no HLFB edge to wait for
+            return motor_hlfb.done_completion()
 
-        # Block thread until speed has been set or timeout of 10 seconds has been reached (whichever is first)
-        gpio.wait_for_edge(self.hlfb_pin, gpio.RISING, timeout=2000)
+        # The timeout is learned from earlier speed changes of about the same size
+        # Re-writing the duty cycle is a safe retry, since the speed does not depend on how often it is set
+        completion = self.hlfb.arm(move_size=motor_hlfb.get_move_size(
+            abs(req_duty_cycle - prev_duty_cycle)), retry_command=lambda: self.pwm.ChangeDutyCycle(req_duty_cycle))
 
-        return True
+        # Block thread until speed has been set or the timeout has been reached (whichever is first)
+        if block:
+            completion.wait()
+
+        return completion
+
+    async def set_speed_async(self, desired_speed):
+        """Async counterpart of set_speed
+        """
+        return await self.set_duty_cycle_async(self.speed_to_duty_cycle(desired_speed))
+
+    async def set_duty_cycle_async(self, req_duty_cycle):
+        """Async counterpart of set_duty_cycle, which awaits the HLFB instead of blocking the thread
+        """
+
+        completion = self.set_duty_cycle(req_duty_cycle, block=False)
+
+        # Await the speed being set OR the timeout (whichever is first)
+        await completion.wait_async()
+
+        return completion
 
     def hlfb_output(self):
         """Returns whether the required speed has been attained  by the motor's encoder (using HLFB: ASG velocity)
@@ -114,24 +210,54 @@ class MotorFlywheelBottom:
         """
         return self.motor_on
 
-    def stop_and_reset_motor(self):
-        """Stops the motor and resets all previously set values to their default values
+    def stop_and_reset_motor(self, release=True):
+        """Stops the motor and resets all previously set values to their default values. Blocks until the flywheel has spun down (or the HLFB timeout has passed).
+
+        Args:
+            release ([bool], optional): Whether to also clean up the motor's channels. Sessions borrowing the motor from motor_context keep them set up. Defaults to True.
+        """
+
+        # Set Input B to low and wait for the HLFB to report the flywheel has stopped
+        self.set_duty_cycle(0)
+
+        self.deenergize_motor()
+        if release:
+            self.release_motor()
+
+    async def stop_and_reset_motor_async(self, release=True):
+        """Async counterpart of stop_and_reset_motor
         """
 
-        # Set Input B to low
-        self.pwm.ChangeDutyCycle(0)
+        # Set Input B to low and await the HLFB reporting the flywheel has stopped
+        await self.set_duty_cycle_async(0)
+
+        self.deenergize_motor()
+        if release:
+            self.release_motor()
+
+    def deenergize_motor(self):
+        """Unenergizes the motor once it has spun down, keeping its channels and PWM set up so that it can be energized again
+        """
 
         # Unenergize the motor
-        gpio.output(self.en_pin, gpio.LOW)
+        gpio_cache.output(self.en_pin, gpio.LOW)
+
+        # Motor is not energized
+        self.motor_on = False
+
+    def release_motor(self):
+        """Stops the PWM and cleans up the motor's channels once it has been unenergized (e.g.: at application exit)
+        """
+
+        self.pwm.stop()
 
         # Clean all FBM-related channels
         # NOTE: Doing this means the pins have been set to their default state, and init method needs to be called again to make this motor work
+        self.hlfb.stop()
         gpio.cleanup(self.fbm_out_channels)
+        gpio_cache.forget(self.fbm_out_channels)
         gpio.cleanup(self.hlfb_pin)
 
-        # Motor is not energized
-        self.motor_on = False
-
 
 def main():
     """main.
@@ -0,0 +1,669 @@
+"""
+motor_hlfb.py
+---
+This file contains the MotorCompletion and HlfbMonitor classes, which turn a motor's High-Level Feedback (HLFB) rising edge into a completion handle instead of blocking the calling thread in gpio.wait_for_edge.
+---
+
+Author: Ball-E contributors
+Date: October 17, 2026
+Last Modified: October 17, 2026
+"""
+
+import asyncio
+import heapq
+import itertools
+import statistics
+import threading
+import time
+from collections import deque
+
+import Jetson.GPIO as gpio
+
+import drill_cancel
+
+# How long (in seconds) a command waits for the HLFB to confirm it
+# NOTE: Commands of a move size with enough history wait for a learned timeout instead, which is never longer than this
+HLFB_TIMEOUT = 2
+
+# How many of the latest HLFB durations are kept for each move size
+HISTORY_LENGTH = 20
+
+# How many HLFB durations a move size needs before its timeout is learned
+MIN_HISTORY = 5
+
+# A learned timeout is this many times the longest duration in the history
+TIMEOUT_FACTOR = 1.5
+
+# Shortest learned timeout (in seconds), so that jitter in the edge callback cannot cause a timeout
+MIN_TIMEOUT = 0.05
+
+# A duration more than this many times the expected one is reported as an outlier
+OUTLIER_FACTOR = 2
+
+# What a monitor does once the pin level shows a timed out command has not been confirmed
+# "recheck" gives up on the command, "retry" re-issues it (if it can be) and waits HLFB_TIMEOUT once more, "abort" aborts the shot the command belongs to
+RECOVERY_POLICIES = ["recheck", "retry", "abort"]
+
+
+class MotorCompletion:
+    """Handle for one motor command that is done once the motor confirms it (or right away if there is nothing to confirm). Callers can wait on it, poll it or combine it with other handles.
+    """
+
+    def __init__(self, deadline=None):
+        """Initializes a command that has not been completed yet
+
+        Args:
+            deadline ([float], optional): time.monotonic() value by which the command is expected to be completed. Waits without a timeout stop there. Defaults to None (no deadline).
+        """
+
+        self.deadline = deadline
+
+        # How the command finished: "done", "timed_out", "aborted" or "failed" (None while it has not finished)
+        self.result = None
+        # Exception that made the command fail (None unless the result is "failed")
+        self.error = None
+        self.done_event = threading.Event()
+        self.done_callbacks = []
+        self.lock = threading.Lock()
+
+    def finish(self, result, error=None):
+        """Marks the command as finished, wakes every wait and runs any done callbacks. Only the first result counts.
+
+        Args:
+            result ([str]): "done", "timed_out", "aborted" or "failed"
+            error ([Exception], optional): Exception that made the command fail. Defaults to None.
+        """
+
+        with self.lock:
+            if self.done_event.is_set():
+                return
+            self.result = result
+            self.error = error
+            self.done_event.set()
+            done_callbacks = self.done_callbacks
+            self.done_callbacks = []
+
+        for done_callback in done_callbacks:
+            done_callback(self)
+
+    def set_done(self):
+        """Marks the command as completed and runs any done callbacks
+        """
+        self.finish("done")
+
+    def set_timed_out(self):
+        """Marks the command as finished without having been confirmed
+        """
+        self.finish("timed_out")
+
+    def abort(self):
+        """Marks the command as aborted (not confirmed, or cut short by a stopped drill), so that the shot it belongs to is not fired
+        """
+        self.finish("aborted")
+
+    def set_failed(self, error):
+        """Marks the command as failed, keeping the exception that was raised while running it
+
+        Args:
+            error ([Exception]): The exception
+        """
+        self.finish("failed", error)
+
+    def is_done(self):
+        """Returns whether the command has been completed (does not block)
+
+        Returns:
+            [bool]: True if completed, False otherwise
+        """
+        return self.result == "done"
+
+    def is_aborted(self):
+        """Returns whether the command has been aborted (does not block)
+
+        Returns:
+            [bool]: True if aborted, False otherwise
+        """
+        return self.result == "aborted"
+
+    def get_remaining_time(self):
+        """Returns how long (in seconds) until the deadline
+
+        Returns:
+            [float]: Remaining time (0 if the deadline has passed), or None if there is no deadline
+        """
+
+        if self.deadline is None:
+            return None
+        return max(0, self.deadline - time.monotonic())
+
+    def wait(self, timeout=None, cancellable=True):
+        """Blocks the thread until the command has been completed OR the timeout has passed OR the drill has been cancelled (whichever is first)
+
+        Args:
+            timeout ([float], optional): Timeout in seconds. Defaults to None (wait until the deadline, or forever if there is none).
+            cancellable ([bool], optional): Whether drill_cancel cuts the wait short. Defaults to True.
+
+        Returns:
+            [bool]: True if completed, False if timed out, aborted or cancelled
+        """
+
+        if timeout is None:
+            timeout = self.get_remaining_time()
+
+        # Either the command or drill_cancel wakes the thread up
+        wake_event = threading.Event()
+        self.add_done_callback(lambda _: wake_event.set())
+        if cancellable:
+            drill_cancel.add_cancel_callback(wake_event.set)
+        try:
+            wake_event.wait(timeout)
+        finally:
+            drill_cancel.remove_cancel_callback(wake_event.set)
+
+        return self.is_done()
+
+    async def wait_async(self, timeout=None, cancellable=True):
+        """Async counterpart of wait, which awaits the completion instead of blocking the thread
+
+        Args:
+            timeout ([float], optional): Timeout in seconds. Defaults to None (wait until the deadline, or forever if there is none).
+            cancellable ([bool], optional): Whether drill_cancel cuts the wait short. Defaults to True.
+
+        Returns:
+            [bool]: True if completed, False if timed out, aborted or cancelled
+        """
+
+        if timeout is None:
+            timeout = self.get_remaining_time()
+
+        loop = asyncio.get_event_loop()
+        done_future = loop.create_future()
+
+        def set_future_done():
+            if not done_future.done():
+                done_future.set_result(self.is_done())
+
+        # The HLFB callback runs on a Jetson.GPIO thread, so the future is completed through the event loop
+        def wake_loop():
+            loop.call_soon_threadsafe(set_future_done)
+
+        self.add_done_callback(lambda _: wake_loop())
+        if cancellable:
+            drill_cancel.add_cancel_callback(wake_loop)
+        try:
+            return await asyncio.wait_for(done_future, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            drill_cancel.remove_cancel_callback(wake_loop)
+
+    def add_done_callback(self, done_callback):
+        """Calls done_callback(completion) once the command has been completed. If it already is, it is called right away.
+
+        Args:
+            done_callback ([function]): Function to call
+        """
+
+        with self.lock:
+            if not self.done_event.is_set():
+                self.done_callbacks.append(done_callback)
+                return
+
+        done_callback(self)
+
+
+def done_completion():
+    """Returns a completion for a command that had nothing to wait for (e.g.: a move of 0 pulses)
+
+    Returns:
+        [MotorCompletion]: Completed handle
+    """
+
+    completion = MotorCompletion()
+    completion.set_done()
+    return completion
+
+
+def chain_completion(completion, next_command, deadline=None):
+    """Returns a completion for a command that has two parts: once the first part's completion is done, next_command() is called and its completion finishes the chained one
+
+    Args:
+        completion ([MotorCompletion]): Completion of the first part
+        next_command ([function]): Issues the second part and returns its MotorCompletion
+        deadline ([float], optional): Deadline of the whole command. Defaults to None.
+
+    Returns:
+        [MotorCompletion]: Done once the second part is done. If the first part is not done (e.g.: it was cut short), the second part is not issued and the chained completion finishes the same way.
+    """
+
+    chained_completion = MotorCompletion(deadline)
+
+    def first_part_done(completion):
+        if not completion.is_done():
+            chained_completion.finish(completion.result, completion.error)
+            return
+        next_command().add_done_callback(
+            lambda completion: chained_completion.finish(completion.result, completion.error))
+
+    completion.add_done_callback(first_part_done)
+    return chained_completion
+
+
+def combine_completions(completions):
+    """Returns a completion that is done once all of the given completions are done
+
+    Args:
+        completions ([list]): MotorCompletions to combine
+
+    Returns:
+        [MotorCompletion]: Combined handle, whose deadline is the latest of the given ones. It fails (with the first exception) if any of them failed, is aborted if any of them was aborted, and timed out if any of them timed out.
+    """
+
+    deadlines = [completion.deadline for completion in completions]
+    combined_completion = MotorCompletion(
+        None if None in deadlines else max(deadlines, default=None))
+    remaining = [len(completions)]
+    remaining_lock = threading.Lock()
+
+    def completion_done(_):
+        with remaining_lock:
+            remaining[0] -= 1
+            all_done = remaining[0] == 0
+        if all_done:
+            results = [completion.result for completion in completions]
+            if "failed" in results:
+                combined_completion.set_failed(
+                    completions[results.index("failed")].error)
+            elif "aborted" in results:
+                combined_completion.abort()
+            elif "timed_out" in results:
+                combined_completion.set_timed_out()
+            else:
+                combined_completion.set_done()
+
+    if not completions:
+        combined_completion.set_done()
+    for completion in completions:
+        completion.add_done_callback(completion_done)
+
+    return combined_completion
+
+
+class TimeoutWatchdog:
+    """Single thread that calls a function once its timeout has passed, so that HLFB commands do not start a timer thread each
+    """
+
+    def __init__(self):
+        """Initializes the watchdog. Its thread is started by the first timeout.
+        """
+
+        # Pending timeouts as (deadline, sequence number, entry) tuples, in a heap ordered by deadline
+        # NOTE: Each entry is a [function, args] list, whose function is set to None once it is cancelled
+        self.timeouts = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.watchdog_thread = None
+
+    def schedule(self, timeout, timeout_function, *args):
+        """Calls timeout_function(*args) on the watchdog thread once the timeout has passed, unless it is cancelled first
+
+        NOTE: timeout_function must not block, since every other timeout waits for it
+
+        Args:
+            timeout ([float]): Timeout in seconds
+            timeout_function ([function]): Function to call
+
+        Returns:
+            [list]: Entry to hand to cancel
+        """
+
+        entry = [timeout_function, args]
+        with self.condition:
+            heapq.heappush(
+                self.timeouts, (time.monotonic() + timeout, next(self.sequence), entry))
+            if self.watchdog_thread is None:
+                self.watchdog_thread = threading.Thread(
+                    target=self.run, name="TimeoutWatchdog", daemon=True)
+                self.watchdog_thread.start()
+            # The new timeout may be the earliest one
+            self.condition.notify()
+
+        return entry
+
+    def cancel(self, entry):
+        """Cancels a timeout (it stays in the heap until its deadline, where it is skipped)
+
+        Args:
+            entry ([list]): Entry from schedule
+        """
+        entry[0] = None
+
+    def run(self):
+        """Watchdog thread: sleeps until the earliest deadline and calls the functions whose timeout has passed
+        """
+
+        while True:
+            with self.condition:
+                while True:
+                    if not self.timeouts:
+                        self.condition.wait()
+                        continue
+                    remaining_time = self.timeouts[0][0] - time.monotonic()
+                    if remaining_time <= 0:
+                        _, _, entry = heapq.heappop(self.timeouts)
+                        break
+                    self.condition.wait(remaining_time)
+
+            timeout_function, args = entry
+            if timeout_function is not None:
+                timeout_function(*args)
+
+
+# Deals with the timeouts of every HLFB monitor
+timeout_watchdog = TimeoutWatchdog()
+
+
+def get_move_size(amount):
+    """Returns the move size a command is recorded under, so that moves of similar sizes share a history
+
+    Args:
+        amount ([float]): How much the command moves the motor (e.g.: number of pulses or duty cycle change)
+
+    Returns:
+        [int]: Smallest power of two that is at least amount
+    """
+    return 1 << max(0, int(amount) - 1).bit_length()
+
+
+class HlfbTimingHistory:
+    """Records how long a motor's HLFB took to confirm its commands, for each move size, and derives the expected duration and timeout of the next command from that
+    """
+
+    def __init__(self, motor_name, max_timeout=HLFB_TIMEOUT):
+        """Initializes an empty history
+
+        Args:
+            motor_name ([str]): Name of the motor (for reports)
+            max_timeout ([float], optional): Timeout used until a move size has enough history, and the longest timeout that can be learned. Defaults to HLFB_TIMEOUT.
+        """
+
+        self.motor_name = motor_name
+        self.max_timeout = max_timeout
+
+        # Latest HLFB durations (in seconds), keyed by move size
+        self.durations = dict()
+        self.lock = threading.Lock()
+
+    def get_durations(self, move_size):
+        """Returns the latest HLFB durations of a move size
+
+        Args:
+            move_size ([object]): Move size (e.g.: from get_move_size)
+
+        Returns:
+            [list]: Durations in seconds, oldest first
+        """
+
+        with self.lock:
+            return list(self.durations.get(move_size, []))
+
+    def get_expected_duration(self, move_size):
+        """Returns how long the HLFB is expected to take for a move size
+
+        Args:
+            move_size ([object]): Move size (e.g.: from get_move_size)
+
+        Returns:
+            [float]: Median of the latest durations, or None if the move size does not have enough history
+        """
+
+        durations = self.get_durations(move_size)
+        if len(durations) < MIN_HISTORY:
+            return None
+        return statistics.median(durations)
+
+    def get_timeout(self, move_size):
+        """Returns how long a command of a move size waits for the HLFB
+
+        Args:
+            move_size ([object]): Move size (e.g.: from get_move_size)
+
+        Returns:
+            [float]: Timeout in seconds
+        """
+
+        durations = self.get_durations(move_size)
+        if len(durations) < MIN_HISTORY:
+            return self.max_timeout
+        return min(self.max_timeout, max(MIN_TIMEOUT, TIMEOUT_FACTOR * max(durations)))
+
+    def record(self, move_size, duration):
+        """Records how long the HLFB took to confirm a command, reporting it if it is an outlier
+
+        Args:
+            move_size ([object]): Move size (e.g.: from get_move_size)
+            duration ([float]): Time (in seconds) from the command being armed to its HLFB edge
+        """
+
+        expected_duration = self.get_expected_duration(move_size)
+        if expected_duration is not None and duration > OUTLIER_FACTOR * expected_duration:
+            print("{} HLFB took {:.3f} s for move size {} (expected {:.3f} s)".format(
+                self.motor_name, duration, move_size, expected_duration))
+
+        with self.lock:
+            if move_size not in self.durations:
+                self.durations[move_size] = deque(maxlen=HISTORY_LENGTH)
+            self.durations[move_size].append(duration)
+
+    def record_timeout(self, move_size, timeout, action):
+        """Reports a command whose HLFB edge did not come within its timeout
+
+        Args:
+            move_size ([object]): Move size (e.g.: from get_move_size), or None if the command had no move size
+            timeout ([float]): Timeout (in seconds) the command had
+            action ([str]): What the monitor did about it (see HlfbMonitor.hlfb_timed_out)
+        """
+
+        print("{} HLFB timed out after {:.3f} s for move size {} ({})".format(
+            self.motor_name, timeout, move_size, action))
+
+
+class HlfbMonitor:
+    """Watches a motor's HLFB pin using an edge callback, so that the motor can hand out a MotorCompletion for each command
+    """
+
+    def __init__(self, hlfb_pin, timeout=HLFB_TIMEOUT, motor_name=None):
+        """Registers the edge callback on the HLFB pin
+
+        NOTE: The HLFB pin must already have been set up as an input
+
+        Args:
+            hlfb_pin ([int]): HLFB pin number
+            timeout ([float], optional): How long (in seconds) a command waits for the HLFB when it blocks, unless its move size has a learned timeout. Defaults to HLFB_TIMEOUT.
+            motor_name ([str], optional): Name of the motor (for reports). Defaults to None (the HLFB pin number is used).
+        """
+
+        self.hlfb_pin = hlfb_pin
+        self.timeout = timeout
+        if motor_name is None:
+            motor_name = "HLFB {}".format(hlfb_pin)
+        self.motor_name = motor_name
+
+        # How long the HLFB took for each move size, which is where the learned timeouts come from
+        self.timing_history = HlfbTimingHistory(motor_name, timeout)
+
+        # The command that is waiting for the next rising edge, its move size, when it was armed, its timeout_watchdog entry, how to re-issue it and whether the recovery policy applies to it
+        self.pending_completion = None
+        self.pending_move_size = None
+        self.arm_time = None
+        self.timeout_entry = None
+        self.pending_retry_command = None
+        self.pending_recoverable = True
+        self.lock = threading.Lock()
+
+        # What to do about a timed out command (see RECOVERY_POLICIES), and the function that is told about every timeout as timeout_callback(motor_name, action)
+        self.recovery_policy = "recheck"
+        self.timeout_callback = None
+
+        gpio.add_event_detect(self.hlfb_pin, gpio.RISING,
+                              callback=self.hlfb_callback)
+
+    def set_recovery_policy(self, recovery_policy, timeout_callback=None):
+        """Selects what the monitor does about timed out commands
+
+        NOTE: The monitors belong to the process-wide motor context, so the session that is running sets this when it starts and puts the defaults back when it stops
+
+        Args:
+            recovery_policy ([str]): One of RECOVERY_POLICIES
+            timeout_callback ([function], optional): Called as timeout_callback(motor_name, action) on every timeout. Defaults to None.
+        """
+
+        if recovery_policy not in RECOVERY_POLICIES:
+            raise ValueError(
+                "Unknown recovery policy '{}'".format(recovery_policy))
+
+        self.recovery_policy = recovery_policy
+        self.timeout_callback = timeout_callback
+
+    def get_timeout(self, move_size=None):
+        """Returns how long a command of a move size waits for the HLFB
+
+        Args:
+            move_size ([object], optional): Move size (e.g.: from get_move_size). Defaults to None (the monitor's timeout).
+
+        Returns:
+            [float]: Timeout in seconds
+        """
+
+        if move_size is None:
+            return self.timeout
+        return self.timing_history.get_timeout(move_size)
+
+    def arm(self, timeout=None, move_size=None, retry_command=None, recoverable=True):
+        """Returns the completion for the command that was just issued. It will be done on the next HLFB rising edge.
+
+        NOTE: Call this right after the command has been issued, which is when gpio.wait_for_edge used to be called
+
+        Args:
+            timeout ([float], optional): How long (in seconds) the command may take. Defaults to the learned timeout of its move size.
+            move_size ([object], optional): Move size the HLFB duration is recorded under (e.g.: from get_move_size). Defaults to None (not recorded).
+            retry_command ([function], optional): Re-issues the command for the "retry" policy. Defaults to None (the command is only waited for once more, for the same timeout).
+            recoverable ([bool], optional): Whether the recovery policy applies once the pin re-check fails. Commands that already carry on as if they were timed (e.g.: feed strokes) are only re-checked. Defaults to True.
+
+        Returns:
+            [MotorCompletion]: Handle for the command. It finishes on the HLFB edge or once the timeout has been dealt with, so it has no deadline of its own.
+        """
+
+        if timeout is None:
+            timeout = self.get_timeout(move_size)
+        completion = MotorCompletion()
+
+        with self.lock:
+            # A newer command supersedes one that never got its edge
+            superseded_completion = self.pending_completion
+            if self.timeout_entry is not None:
+                timeout_watchdog.cancel(self.timeout_entry)
+            self.pending_completion = completion
+            self.pending_move_size = move_size
+            self.pending_retry_command = retry_command
+            self.pending_recoverable = recoverable
+            self.arm_time = time.monotonic()
+            self.timeout_entry = timeout_watchdog.schedule(
+                timeout, self.hlfb_timed_out, completion, timeout, False)
+
+        # Nothing is going to finish the superseded command anymore
+        if superseded_completion is not None:
+            superseded_completion.set_timed_out()
+
+        return completion
+
+    def hlfb_callback(self, channel):
+        """Called by Jetson.GPIO on every HLFB rising edge
+
+        Args:
+            channel ([int]): HLFB pin number
+        """
+
+        with self.lock:
+            completion = self.pending_completion
+            move_size = self.pending_move_size
+            arm_time = self.arm_time
+            timeout_entry = self.timeout_entry
+            self.pending_completion = None
+            self.timeout_entry = None
+
+        if timeout_entry is not None:
+            timeout_watchdog.cancel(timeout_entry)
+
+        if completion is not None:
+            if move_size is not None:
+                self.timing_history.record(
+                    move_size, time.monotonic() - arm_time)
+            completion.set_done()
+
+    def hlfb_timed_out(self, completion, timeout, retried):
+        """Called on the timeout_watchdog thread once a command's timeout has passed without its HLFB edge. The pin level is re-checked first (the edge may have been missed), then the recovery policy decides.
+
+        NOTE: The command stays pending, so that the duration of a late edge still makes the learned timeout longer
+
+        Args:
+            completion ([MotorCompletion]): The command's completion
+            timeout ([float]): The command's timeout in seconds
+            retried ([bool]): Whether the command has already been retried
+        """
+
+        with self.lock:
+            if self.pending_completion is not completion:
+                return
+            move_size = self.pending_move_size
+            retry_command = self.pending_retry_command
+            recoverable = self.pending_recoverable
+
+        # A stopped drill cuts commands short on purpose
+        if drill_cancel.is_cancelled():
+            completion.set_timed_out()
+            return
+
+        if gpio.input(self.hlfb_pin) == gpio.HIGH:
+            # The motor confirms the command, only the edge was missed
+            action = "recovered"
+        elif not recoverable:
+            action = "timed out"
+        elif self.recovery_policy == "retry" and not retried:
+            action = "retried"
+        elif self.recovery_policy == "abort":
+            action = "aborted"
+        else:
+            action = "timed out"
+
+        self.timing_history.record_timeout(move_size, timeout, action)
+        # NOTE: The session hears about the timeout before anyone waiting for the command wakes up
+        if self.timeout_callback is not None:
+            self.timeout_callback(self.motor_name, action)
+
+        if action == "recovered":
+            completion.set_done()
+        elif action == "retried":
+            if retry_command is not None:
+                retry_command()
+            with self.lock:
+                if self.pending_completion is completion:
+                    # The retried command gets the same (learned) timeout as the first try
+                    self.timeout_entry = timeout_watchdog.schedule(
+                        timeout, self.hlfb_timed_out, completion, timeout, True)
+        elif action == "aborted":
+            completion.abort()
+        else:
+            completion.set_timed_out()
+
+    def stop(self):
+        """Removes the edge callback (must be called before the HLFB pin is cleaned up)
+        """
+
+        gpio.remove_event_detect(self.hlfb_pin)
+
+        with self.lock:
+            if self.timeout_entry is not None:
+                timeout_watchdog.cancel(self.timeout_entry)
+            self.pending_completion = None
+            self.timeout_entry = None
@@ -13,17 +13,25 @@ import time
 
 import Jetson.GPIO as gpio
 
+import gpio_cache
+import motor_calibration
+import motor_hlfb
+import pulse_train
+
 
 class MotorPitch:
     """The PM Motor will be controlled using the 'Move to Move to Incremental Distance (2 Distance, Home To Switch)' Setting. 
     """
 
-    def __init__(self):
+    def __init__(self, in_b_pin=None):
         """Any motor intialization code will go here
         Enable Pin: Pin 21- Energizes the motor
         Input A: Pin 23 - Selects the position (0 is pos. 1 and 1 is pos. 2)
-        Input B: Pin 6 (GND)
+        Input B: Pin 6 (GND) - Selects coarse distances (0 is fine and 1 is coarse) once wired to a GPIO pin and the motor is set to 4 distances
         HLFB: Pin 19
+
+        Args:
+            in_b_pin ([int], optional): GPIO pin Input B is wired to, which enables the coarse distances. Defaults to None (Input B is wired to GND, so only the fine distances are used).
         """
 
         # Board pin-numbering scheme
@@ -39,80 +47,278 @@ class MotorPitch:
         # Input A pin set to low (Position 1)
         # HLFB pin set as input
         self.pm_channels = [self.en_pin, self.in_a_pin]
-        gpio.setup(self.pm_channels, gpio.OUT, initial=gpio.LOW)
+
+        # Input B pin number. None while Input B is wired to GND, in which case only the fine distances are used.
+        self.in_b_pin = in_b_pin
+        if self.in_b_pin is not None:
+            # Input B pin set to low (fine distance)
+            self.pm_channels.append(self.in_b_pin)
+        gpio_cache.setup_outputs(self.pm_channels)
         gpio.setup(self.hlfb_pin, gpio.IN)
 
+        # HLFB rising edges complete the command that is waiting for them
+        self.hlfb = motor_hlfb.HlfbMonitor(
+            self.hlfb_pin, motor_name="pm")
+
+        # How long (in seconds) energizing waits for the HLFB to report the motor is ready
+        self.energize_timeout = motor_hlfb.HLFB_TIMEOUT
+
         # This variable will track whether or not the motor is energized
         self.motor_on = False
 
         # Stores how many degrees yaw mechanism moves with one rotation of the motor
         self.rotation_to_degree = 1
 
-        # This variable will store the position of the motor (By default, it should be centered - cnt. 0)
+        # How many fine distances (1 rotation_to_degree each) one coarse distance is
+        self.coarse_to_fine = 10
+
+        # This variable will store the position of the motor in fine distances (By default, it should be centered - cnt. 0)
         self.curr_encoder_count = 0
 
-        # This variable is the amount of time for triggering enable
-        self.en_trig_time = 0.02
+        # This variable is the amount of time for triggering enable (0.02 s unless this machine has been calibrated)
+        self.en_trig_time = motor_calibration.get_calibrated_value(
+            "pm_en_trig_time", 0.02)
+
+        # This variable is the amount of time enable stays high between two triggers
+        self.en_gap_time = 0.001
 
-    def energize_motor(self):
+        # Enable pulses are emitted by their own timing thread
+        self.pulse_train = pulse_train.PulseTrain(
+            self.en_pin, self.en_trig_time, self.en_gap_time)
+
+    def energize_motor(self, block=True):
         """Turns the motor on
+
+        Args:
+            block ([bool], optional): Whether to block the thread until the HLFB reports the motor is ready. Defaults to True.
+
+        Returns:
+            [MotorCompletion]: Done once the HLFB reports the motor is ready
         """
+        # Already energized, so there is no HLFB edge to wait for
+        if gpio_cache.get_level(self.en_pin) == gpio.HIGH:
+            self.motor_on = True
+            return motor_hlfb.done_completion()
+
+        # The HLFB goes high once the motor is enabled and ready
+        completion = self.hlfb.arm(self.energize_timeout)
+
         # Set Enable pin to high to energize motor
-        gpio.output(self.en_pin, gpio.HIGH)
+        gpio_cache.output(self.en_pin, gpio.HIGH)
 
         # Motor is now energized
         self.motor_on = True
 
-    def pulse_enable(self):
-        """Pulsing the enable pin is how this motor knows to move the distance selected by Input A
+        if block:
+            completion.wait()
+
+        return completion
+
+    async def energize_motor_async(self):
+        """Async counterpart of energize_motor
         """
-        gpio.output(self.en_pin, gpio.LOW)
-        time.sleep(self.en_trig_time)
-        gpio.output(self.en_pin, gpio.HIGH)
 
-    def pitch_up(self, degree, num_pulses=None):
-        """Pitch motor pitches up by X degree
+        completion = self.energize_motor(block=False)
+
+        # Await the rising edge OR the timeout (whichever is first)
+        await completion.wait_async()
+
+        return completion
+
+    def degree_to_pulses(self, degree):
+        """Returns how many fine enable pulses are needed to move by X degree
+
+        Args:
+            degree ([float]): Relative angle (sign is ignored)
+
+        Returns:
+            [int]: Number of pulses
         """
+        return abs(int(degree/self.rotation_to_degree))
 
-        if num_pulses is None:
-            # Calculate how many movements we need to achieve that degree
-            num_pulses = abs(int(degree/self.rotation_to_degree))
+    def pitch_up(self, degree, num_pulses=None, block=True):
+        """Pitch motor pitches up by X degree
+
+        Args:
+            degree ([float]): Relative angle (sign is ignored)
+            num_pulses ([int], optional): Number of enable pulses, if already calculated. Defaults to None.
+            block ([bool], optional): Whether to block the thread until the HLFB confirms the move. Defaults to True.
+
+        Returns:
+            [MotorCompletion]: Done once the HLFB confirms the move
+        """
 
         # Set Input A to high to move distance 2
-        gpio.output(self.in_a_pin, gpio.HIGH)
+        return self.move(gpio.HIGH, degree, num_pulses, block)
 
-        for _ in range(num_pulses):
-            self.pulse_enable()
+    def pitch_down(self, degree, num_pulses=None, block=True):
+        """Pitch motor pitches down by X degree
 
-        # Block the thread until rising edge has been detected OR 10 seconds have passed (whichever is first)
-        gpio.wait_for_edge(self.hlfb_pin, gpio.RISING, timeout=2000)
+        Args:
+            degree ([float]): Relative angle (sign is ignored)
+            num_pulses ([int], optional): Number of enable pulses, if already calculated. Defaults to None.
+            block ([bool], optional): Whether to block the thread until the HLFB confirms the move. Defaults to True.
 
-        # Update the state of position variable
-        self.curr_encoder_count += num_pulses
-        print('hit updating count for pitch up: {}'.format(
-            self.curr_encoder_count))
+        Returns:
+            [MotorCompletion]: Done once the HLFB confirms the move
+        """
 
-    def pitch_down(self, degree, num_pulses=None):
-        """Yaw motor moves left by X degree
+        # Set Input A to low to move distance 1
+        return self.move(gpio.LOW, degree, num_pulses, block)
+
+    async def pitch_up_async(self, degree, num_pulses=None):
+        """Async counterpart of pitch_up
+        """
+        return await self.move_async(gpio.HIGH, degree, num_pulses)
+
+    async def pitch_down_async(self, degree, num_pulses=None):
+        """Async counterpart of pitch_down
+        """
+        return await self.move_async(gpio.LOW, degree, num_pulses)
+
+    def move(self, in_a_level, degree, num_pulses=None, block=True):
+        """Pitch motor moves by X degree in the direction selected by Input A
+
+        Args:
+            in_a_level ([int]): gpio.HIGH moves up (distance 2), gpio.LOW moves down (distance 1)
+            degree ([float]): Relative angle (sign is ignored)
+            num_pulses ([int], optional): Distance in fine pulses, if already calculated. Defaults to None.
+            block ([bool], optional): Whether to block the thread until the HLFB confirms the move. Defaults to True.
+
+        Returns:
+            [MotorCompletion]: Done once all pulses have been emitted and the HLFB confirms the move
         """
 
         if num_pulses is None:
             # Calculate how many movements we need to achieve that degree
-            num_pulses = abs(int(degree/self.rotation_to_degree))
+            num_pulses = self.degree_to_pulses(degree)
+
+        self.update_encoder_count(in_a_level, num_pulses)
+
+        # The timing thread sets Input A (and B) and emits the pulses of each distance in order
+        pulses_done = motor_hlfb.done_completion()
+        for in_b_level, distance_pulses in self.plan_move(num_pulses):
+            pin_levels = [(self.in_a_pin, in_a_level)]
+            if self.in_b_pin is not None:
+                pin_levels.append((self.in_b_pin, in_b_level))
+            # Pulses a stopped drill cut off are taken back off the encoder count (a coarse pulse is coarse_to_fine fine pulses)
+            fine_per_pulse = self.coarse_to_fine if in_b_level == gpio.HIGH else 1
+            pulses_done = self.pulse_train.send(distance_pulses, pin_levels, lambda num_dropped, fine_per_pulse=fine_per_pulse: self.update_encoder_count(
+                in_a_level, -num_dropped*fine_per_pulse))
+
+        # The HLFB is armed once the last pulse is out, and its monitor finishes the move once it is confirmed or its timeout has been dealt with
+        completion = motor_hlfb.chain_completion(
+            pulses_done,
+            lambda: self.finish_move(num_pulses))
+
+        # Block the thread until rising edge has been detected OR the timeout has passed (whichever is first)
+        if block:
+            completion.wait()
+
+        return completion
+
+    def plan_move(self, num_pulses):
+        """Splits a move into coarse and fine distances, so that big moves need far fewer enable pulses
+
+        Args:
+            num_pulses ([int]): Distance in fine pulses
+
+        Returns:
+            [list]: (Input B level, number of pulses) tuples in the order they are sent (coarse first)
+        """
 
-        # Set Input A to high to move distance 1
-        gpio.output(self.in_a_pin, gpio.LOW)
+        # Without Input B, every pulse is a fine distance
+        if self.in_b_pin is None:
+            coarse_pulses, fine_pulses = 0, num_pulses
+        else:
+            coarse_pulses, fine_pulses = divmod(
+                num_pulses, self.coarse_to_fine)
 
-        for _ in range(num_pulses):
-            self.pulse_enable()
+        return [(in_b_level, distance_pulses) for in_b_level, distance_pulses in ((gpio.HIGH, coarse_pulses), (gpio.LOW, fine_pulses))
+                if distance_pulses > 0]
 
-        # Block the thread until rising edge has been detected OR 10 seconds have passed (whichever is first)
-        gpio.wait_for_edge(self.hlfb_pin, gpio.RISING, timeout=2000)
+    def get_move_duration(self, num_pulses):
+        """Returns how long (in seconds) the enable pulses of a move take
+
+        Args:
+            num_pulses ([int]): Distance in fine pulses
+
+        Returns:
+            [float]: Duration in seconds
+        """
+        return self.pulse_train.get_duration(sum(distance_pulses for _, distance_pulses in self.plan_move(num_pulses)))
+
+    async def move_async(self, in_a_level, degree, num_pulses=None):
+        """Async counterpart of move, which awaits the pulses and the HLFB instead of blocking the thread
+        """
+
+        completion = self.move(in_a_level, degree, num_pulses, block=False)
+
+        # Await the rising edge OR the timeout (whichever is first)
+        await completion.wait_async()
+
+        return completion
+
+    def finish_move(self, num_pulses):
+        """Hands out the completion for a move whose pulses have all been sent
+
+        Args:
+            num_pulses ([int]): Distance in fine pulses
+
+        Returns:
+            [MotorCompletion]: Done once the HLFB confirms the move
+        """
+
+        # Nothing moves with 0 pulses, so there is no HLFB edge to wait for
+        if num_pulses == 0:
+            return motor_hlfb.done_completion()
+        # The timeout is learned from earlier moves of about the same size
+        return self.hlfb.arm(move_size=motor_hlfb.get_move_size(num_pulses))
+
+    def update_encoder_count(self, in_a_level, num_pulses):
+        """Updates the encoder count as soon as a move is issued, so that the next move is planned from where this one ends
+
+        Args:
+            in_a_level ([int]): Input A level the move was made with
+            num_pulses ([int]): Distance in fine pulses
+        """
 
         # Update the state of position variable
-        self.curr_encoder_count -= num_pulses
-        print('hit updating count for pitch down: {}'.format(
-            self.curr_encoder_count))
+        if in_a_level == gpio.HIGH:
+            self.curr_encoder_count += num_pulses
+            print('hit updating count for pitch up: {}'.format(
+                self.curr_encoder_count))
+        else:
+            self.curr_encoder_count -= num_pulses
+            print('hit updating count for pitch down: {}'.format(
+                self.curr_encoder_count))
+
+    def move_to(self, target_encoder_count, block=True):
+        """Pitch motor moves to an absolute encoder count in one command, no matter where the previous move ended
+
+        Args:
+            target_encoder_count ([int]): Encoder count (in fine pulses from center) to move to
+            block ([bool], optional): Whether to block the thread until the HLFB confirms the move. Defaults to True.
+
+        Returns:
+            [MotorCompletion]: Done once all pulses have been emitted and the HLFB confirms the move
+        """
+
+        delta_count = target_encoder_count - self.curr_encoder_count
+        if delta_count >= 0:
+            return self.pitch_up(degree=None, num_pulses=delta_count, block=block)
+        return self.pitch_down(degree=None, num_pulses=-delta_count, block=block)
+
+    async def move_to_async(self, target_encoder_count):
+        """Async counterpart of move_to
+        """
+
+        completion = self.move_to(target_encoder_count, block=False)
+
+        # Await the rising edge OR the timeout (whichever is first)
+        await completion.wait_async()
+
+        return completion
 
     def get_motor_state(self):
         """Returns whether or not the motor is energized
@@ -133,34 +339,68 @@ class MotorPitch:
         """
         print("resetting pitch w/ encoder count: {}".format(self.curr_encoder_count))
 
-        # Pitch motor facing up, so move the opposite direction to reset
-        if self.curr_encoder_count > 0:
-            self.pitch_down(degree=None, num_pulses=self.curr_encoder_count)
-        # Pitch motor facing down, so move the opposite direction to reset
-        elif self.curr_encoder_count < 0:
-            self.pitch_up(degree=None, num_pulses=self.curr_encoder_count)
+        # Move back to encoder count 0 in one command, whichever side the motor is facing
+        self.move_to(0)
 
-    def stop_and_reset_motor(self):
-        """Stops the motor and resets all previously set values to their default values
+    async def reset_pitch_async(self):
+        """Async counterpart of reset_pitch
         """
+        print("resetting pitch w/ encoder count: {}".format(self.curr_encoder_count))
+
+        # Move back to encoder count 0 in one command, whichever side the motor is facing
+        await self.move_to_async(0)
+
+    def stop_and_reset_motor(self, release=True):
+        """Stops the motor and resets all previously set values to their default values
 
-        # Reset pitch to 0
+        Args:
+            release ([bool], optional): Whether to also clean up the motor's channels. Sessions borrowing the motor from motor_context keep them set up. Defaults to True.
+        """
+        # Reset the pitch motor
         self.reset_pitch()
 
+        self.deenergize_motor()
+        if release:
+            self.release_motor()
+
+    async def stop_and_reset_motor_async(self, release=True):
+        """Async counterpart of stop_and_reset_motor
+        """
+
+        # Reset the pitch motor
+        await self.reset_pitch_async()
+
+        self.deenergize_motor()
+        if release:
+            self.release_motor()
+
+    def deenergize_motor(self):
+        """Unenergizes the motor once it has been reset, keeping its channels set up so that it can be energized again
+        """
+
         # Set Input A to low to move to position 1
-        gpio.output(self.in_a_pin, gpio.LOW)
+        gpio_cache.output(self.in_a_pin, gpio.LOW)
 
         # Unenergize the motor
-        gpio.output(self.en_pin, gpio.LOW)
+        gpio_cache.output(self.en_pin, gpio.LOW)
+
+        # Motor is not energized
+        self.motor_on = False
+
+    def release_motor(self):
+        """Cleans up the motor's channels once it has been unenergized (e.g.: at application exit)
+        """
+
+        # The timing thread is not needed anymore
+        self.pulse_train.stop()
 
         # Clean all PM-related channels
         # NOTE: Doing this means the pins have been set to their default state, and init method needs to be called again to make this motor work
+        self.hlfb.stop()
         gpio.cleanup(self.pm_channels)
+        gpio_cache.forget(self.pm_channels)
         gpio.cleanup(self.hlfb_pin)
 
-        # Motor is not energized
-        self.motor_on = False
-
 
 def main():
     """main.
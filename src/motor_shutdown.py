@@ -0,0 +1,46 @@
+"""
+motor_shutdown.py
+---
+This file contains the shutdown coordinator, which stops and resets all motors at the same time (flywheels spin down, the feed retracts and both axes home together) and reports when the machine is safe.
+---
+
+Author: Ball-E contributors
+Date: October 17, 2026
+Last Modified: October 17, 2026
+"""
+
+import threading
+import time
+
+
+def shut_down_motors(motors, release=True):
+    """Calls stop_and_reset_motor on every motor on its own thread and returns once all of them are done, so shutting down takes as long as the slowest motor
+
+    Args:
+        motors ([dict]): Motors keyed by name
+        release ([bool], optional): Whether the motors also clean up their channels. Defaults to True.
+
+    Returns:
+        [dict]: How long (in seconds) each motor took to stop and reset, keyed by motor name
+    """
+
+    start_time = time.monotonic()
+    reset_times = dict()
+
+    def reset_motor(motor_name, motor):
+        try:
+            motor.stop_and_reset_motor(release)
+        finally:
+            reset_times[motor_name] = time.monotonic() - start_time
+
+    reset_threads = [threading.Thread(target=reset_motor, args=(motor_name, motor), name="Reset-{}".format(motor_name))
+                     for motor_name, motor in motors.items()]
+    for reset_thread in reset_threads:
+        reset_thread.start()
+    for reset_thread in reset_threads:
+        reset_thread.join()
+
+    print("Machine safe after {:.3f} s ({})".format(time.monotonic() - start_time, ", ".join(
+        "{}: {:.3f} s".format(motor_name, reset_time) for motor_name, reset_time in reset_times.items())))
+
+    return reset_times
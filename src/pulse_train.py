@@ -0,0 +1,166 @@
+"""
+pulse_train.py
+---
+This file contains the PulseTrain class, which emits N enable pulses for the incremental-distance motors (yaw and pitch) on a dedicated timing thread with precise spacing.
+NOTE: The Jetson Nano's only hardware PWM channels (pins 32 and 33) drive the flywheels, so the enable pins cannot use a hardware PWM burst. The timing thread is used instead.
+---
+
+Author: Ball-E contributors
+Date: October 17, 2026
+Last Modified: October 17, 2026
+"""
+
+import queue
+import threading
+import time
+
+import Jetson.GPIO as gpio
+
+import drill_cancel
+import gpio_cache
+import motor_hlfb
+
+# Below this much time (in seconds) left until an edge, the timing thread spins instead of sleeping, since time.sleep overshoots by about this much
+SPIN_TIME = 0.002
+
+
+def sleep_until(deadline):
+    """Blocks the thread until the given time.perf_counter() value. Sleeps for most of the time and spins for the last SPIN_TIME for precise edges.
+
+    Args:
+        deadline ([float]): time.perf_counter() value to wait for
+    """
+
+    remaining_time = deadline - time.perf_counter()
+    if remaining_time > SPIN_TIME:
+        time.sleep(remaining_time - SPIN_TIME)
+    while time.perf_counter() < deadline:
+        pass
+
+
+class PulseTrain:
+    """Emits enable pulses (low for pulse_low_time, then high for pulse_high_time) on its own thread. Callers hand it a pulse count and get back one completion.
+    """
+
+    def __init__(self, en_pin, pulse_low_time, pulse_high_time):
+        """Starts the timing thread
+
+        Args:
+            en_pin ([int]): Enable pin number (must already be set up as an output)
+            pulse_low_time ([float]): How long (in seconds) the enable pin is low for each pulse
+            pulse_high_time ([float]): How long (in seconds) the enable pin is high between pulses
+        """
+
+        self.en_pin = en_pin
+        self.pulse_low_time = pulse_low_time
+        self.pulse_high_time = pulse_high_time
+
+        # Pulse trains waiting to be emitted, as (number of pulses, pin levels, completion, pulses dropped callback) tuples. None stops the thread.
+        self.pulse_queue = queue.Queue()
+
+        # Completion of the last train that was sent (trains finish in order, so it is the last one to finish)
+        self.last_completion = motor_hlfb.done_completion()
+
+        self.pulse_thread = threading.Thread(
+            target=self.run, name="PulseTrain-{}".format(self.en_pin), daemon=True)
+        self.pulse_thread.start()
+
+    def get_duration(self, num_pulses):
+        """Returns how long (in seconds) emitting the given number of pulses takes
+
+        Args:
+            num_pulses ([int]): Number of pulses
+
+        Returns:
+            [float]: Duration in seconds
+        """
+        return num_pulses * (self.pulse_low_time + self.pulse_high_time)
+
+    def send(self, num_pulses, pin_levels=None, pulses_dropped=None):
+        """Queues a train of pulses. Trains are emitted in the order they were sent.
+
+        Args:
+            num_pulses ([int]): Number of pulses
+            pin_levels ([list], optional): (pin, level) tuples (e.g.: Input A and B) the timing thread sets right before this train, so they cannot change under an earlier train. Defaults to None.
+            pulses_dropped ([function], optional): Called as pulses_dropped(number of pulses) with the pulses that were not emitted because the drill was stopped. Defaults to None.
+
+        Returns:
+            [MotorCompletion]: Done once the last pulse has been emitted, aborted if the drill was stopped before that
+        """
+
+        if num_pulses == 0:
+            return motor_hlfb.done_completion()
+
+        completion = motor_hlfb.MotorCompletion()
+        self.last_completion = completion
+        self.pulse_queue.put(
+            (num_pulses, pin_levels or [], completion, pulses_dropped))
+        return completion
+
+    def wait_for_idle(self):
+        """Blocks the thread until every train that was sent has been emitted (or dropped because the drill was stopped)
+        """
+        self.last_completion.wait(cancellable=False)
+
+    async def wait_for_idle_async(self):
+        """Async counterpart of wait_for_idle
+        """
+        await self.last_completion.wait_async(cancellable=False)
+
+    def run(self):
+        """Timing thread: emits each queued pulse train
+        """
+
+        while True:
+            pulse_train = self.pulse_queue.get()
+            if pulse_train is None:
+                return
+
+            num_pulses, pin_levels, completion, pulses_dropped = pulse_train
+
+            # Trains that were queued before the drill was stopped are dropped
+            emitted_pulses = 0
+            if not drill_cancel.is_cancelled():
+                for pin, level in pin_levels:
+                    gpio_cache.output(pin, level)
+                emitted_pulses = self.emit(num_pulses)
+
+            if emitted_pulses < num_pulses:
+                if pulses_dropped is not None:
+                    pulses_dropped(num_pulses - emitted_pulses)
+                completion.abort()
+            else:
+                completion.set_done()
+
+    def emit(self, num_pulses):
+        """Emits the pulses against absolute deadlines, so that the time spent in gpio.output does not add up over the train. Stops between two pulses once the drill is cancelled.
+
+        Args:
+            num_pulses ([int]): Number of pulses
+
+        Returns:
+            [int]: Number of pulses that were emitted
+        """
+
+        next_edge = time.perf_counter()
+        for pulse_num in range(num_pulses):
+            # The enable pin is high between pulses, so the motor is left energized
+            if drill_cancel.is_cancelled():
+                return pulse_num
+
+            gpio_cache.output(self.en_pin, gpio.LOW)
+            next_edge += self.pulse_low_time
+            sleep_until(next_edge)
+
+            gpio_cache.output(self.en_pin, gpio.HIGH)
+            next_edge += self.pulse_high_time
+            sleep_until(next_edge)
+
+        return num_pulses
+
+    def stop(self):
+        """Stops the timing thread once all queued pulse trains have been emitted
+        """
+
+        self.pulse_queue.put(None)
+        self.pulse_thread.join()
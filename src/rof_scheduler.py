@@ -0,0 +1,124 @@
+"""
+rof_scheduler.py
+---
+This file contains the RofScheduler class, which keeps a drill at its Rate of Fire (ROF) by giving every ball a fire deadline on the monotonic clock, instead of sleeping a fixed amount around the feed stroke.
+---
+
+Author: Ball-E contributors
+Date: October 17, 2026
+Last Modified: October 17, 2026
+"""
+
+import time
+
+import drill_cancel
+
+# Lag (in seconds) below which a ball counts as on time, since time.sleep overshoots by a few milliseconds
+LAG_TOLERANCE = 0.01
+
+
+class RofScheduler:
+    """Hands out the time each ball should be fired at. A ball that is ready early waits for its deadline, and a ball that is ready late is fired right away and its lag is reported.
+    """
+
+    def __init__(self, rof):
+        """Initializes the scheduler
+
+        Args:
+            rof ([float]): Rate of fire (in seconds between two balls). None means no ROF (manual training session), so balls are fired as soon as they are ready.
+        """
+
+        self.rof = rof
+
+        # time.monotonic() value the next ball should be fired at (None until the first ball has been fired)
+        self.next_fire_time = None
+
+        # Lag (in seconds) of every fired ball, in firing order
+        self.lags = []
+
+    def reset(self):
+        """Forgets the previous ball, so that the next ball is fired as soon as it is ready (e.g.: at the start of a drill)
+        """
+
+        self.next_fire_time = None
+        self.lags = []
+
+    def get_fire_delay(self):
+        """Returns how long (in seconds) until the next ball should be fired
+
+        Returns:
+            [float]: Time until the deadline, negative if the deadline has already passed
+        """
+
+        if self.rof is None or self.next_fire_time is None:
+            return 0
+        return self.next_fire_time - time.monotonic()
+
+    def wait_for_fire_time(self):
+        """Blocks the thread until the next ball should be fired, then marks it as fired
+
+        Returns:
+            [float]: Lag (in seconds) of the ball, 0 if it was fired on time
+        """
+
+        fire_delay = self.get_fire_delay()
+        if fire_delay > 0:
+            drill_cancel.sleep(fire_delay)
+        return self.record_fire()
+
+    async def wait_for_fire_time_async(self):
+        """Async counterpart of wait_for_fire_time
+
+        Returns:
+            [float]: Lag (in seconds) of the ball, 0 if it was fired on time
+        """
+
+        fire_delay = self.get_fire_delay()
+        if fire_delay > 0:
+            await drill_cancel.sleep_async(fire_delay)
+        return self.record_fire()
+
+    def record_fire(self):
+        """Marks the ball as fired now and sets the next ball's deadline
+
+        Returns:
+            [float]: Lag (in seconds) of the ball, 0 if it was fired on time
+        """
+
+        fire_time = time.monotonic()
+        lag = 0
+        if self.next_fire_time is not None:
+            lag = max(0, fire_time - self.next_fire_time)
+
+        if self.rof is not None:
+            if self.next_fire_time is None or lag > LAG_TOLERANCE:
+                # A late ball pushes the following deadlines back, so that two balls are never closer than the ROF
+                self.next_fire_time = fire_time + self.rof
+            else:
+                # On time, so stay on the ROF grid and do not let sleep overshoot add up
+                self.next_fire_time += self.rof
+
+        self.lags.append(lag)
+        if lag > LAG_TOLERANCE:
+            print("Ball fired {:.3f} s behind the ROF".format(lag))
+
+        return lag
+
+
+def main():
+    """main.
+
+    Main prototype/testing area. Code prototyping and checking happens here.
+    """
+
+    rof_scheduler = RofScheduler(1)
+    start_time = time.monotonic()
+    for ball_work_time in (0.2, 0.5, 1.5, 0.2):
+        time.sleep(ball_work_time)
+        rof_scheduler.wait_for_fire_time()
+        print("Fired at {:.3f} s".format(time.monotonic() - start_time))
+
+
+if __name__ == "__main__":
+    # Run the main function
+    main()
@@ -0,0 +1,362 @@
+"""
+shot_engine.py
+---
+This file contains the ShotEngine class, which splits every shot into stages (aim, drop, fire, return) and lets the stages of consecutive shots overlap wherever they do not need the same motor. It also contains the ShotHandle class, which lets the GUI follow (and cancel) a queued manual shot.
+---
+
+Author: Ball-E contributors
+Date: October 17, 2026
+Last Modified: October 17, 2026
+"""
+
+import threading
+
+import drill_cancel
+import gpio_cache
+import motor_hlfb
+
+# Motors each stage owns while it runs. A stage only starts once the previous owner of each of its motors is done.
+AIM_MOTORS = ("ym", "pm", "fmt", "fmb")
+DROP_MOTORS = ("bqm",)
+FEED_MOTORS = ("bfm",)
+
+# States of a shot, in order. A shot ends up "done", or "cancelled" if it was cancelled or the drill was stopped before it was shot.
+SHOT_STATES = ["queued", "aiming", "fired", "done", "cancelled"]
+
+
+class ShotQueueFullError(Exception):
+    """Raised when a manual shot is submitted while the maximum number of shots is already waiting
+    """
+
+
+class ShotHandle:
+    """Handle for one submitted shot. It goes from "queued" to "aiming", "fired" and "done", and it can be cancelled while it is still queued.
+    """
+
+    def __init__(self, shot_id, drill_plan_step):
+        """Initializes a queued shot
+
+        Args:
+            shot_id ([int]): Number of the shot in the session
+            drill_plan_step ([DrillPlanStep]): Compiled shot (its shot_move is recalculated when aiming starts)
+        """
+
+        self.shot_id = shot_id
+        self.drill_plan_step = drill_plan_step
+        self.state = "queued"
+        self.state_callbacks = []
+        self.lock = threading.Lock()
+
+        # Done once the shot has reached "done" or "cancelled"
+        self.completion = motor_hlfb.MotorCompletion()
+
+    def add_state_callback(self, state_callback):
+        """Calls state_callback(shot handle, state) on every state change
+
+        Args:
+            state_callback ([function]): Function to call
+        """
+
+        self.state_callbacks.append(state_callback)
+
+    def set_state(self, state, from_states=None):
+        """Changes the state of the shot
+
+        Args:
+            state ([str]): New state
+            from_states ([list], optional): Only change the state if it is one of these. Defaults to None (any state).
+
+        Returns:
+            [bool]: True if the state was changed, False otherwise
+        """
+
+        with self.lock:
+            if from_states is not None and self.state not in from_states:
+                return False
+            self.state = state
+
+        self.notify_state(state)
+        return True
+
+    def notify_state(self, state):
+        """Runs the state callbacks for a state change and completes the handle once the shot has ended
+
+        Args:
+            state ([str]): New state
+        """
+
+        for state_callback in self.state_callbacks:
+            state_callback(self, state)
+        if state in ("done", "cancelled"):
+            self.completion.set_done()
+
+    def start(self):
+        """Moves the shot out of the queue once its first stage starts
+
+        Returns:
+            [bool]: True if the shot should be shot, False if it was cancelled
+        """
+
+        with self.lock:
+            if self.state == "cancelled":
+                return False
+            # Aiming and the queue drop both start the shot, whichever runs first
+            first_stage = self.state == "queued"
+            if first_stage:
+                self.state = "aiming"
+
+        if first_stage:
+            self.notify_state("aiming")
+        return True
+
+    def cancel(self):
+        """Cancels the shot if it is still queued
+
+        Returns:
+            [bool]: True if cancelled, False if the shot had already started
+        """
+        return self.set_state("cancelled", ["queued"])
+
+    def is_pending(self):
+        """Returns whether the shot has not been done or cancelled yet
+
+        Returns:
+            [bool]: True if pending, False otherwise
+        """
+        return not self.completion.is_done()
+
+    def wait(self, timeout=None):
+        """Blocks the thread until the shot is done or cancelled OR the timeout has passed
+
+        Args:
+            timeout ([float], optional): Timeout in seconds. Defaults to None (no timeout).
+
+        Returns:
+            [bool]: True if done or cancelled, False if timed out
+        """
+        return self.completion.wait(timeout)
+
+
+class ShotEngine:
+    """Runs a list of drill plan steps as overlapping stages. For ball k+1, aiming starts as soon as ball k has been fired (while the feed is still coming back), and the queue turns to drop ball k+1 as soon as the feed is back, while ball k+1 is still being aimed.
+    """
+
+    def __init__(self, session_handler):
+        """Initializes the engine
+
+        Args:
+            session_handler ([ThreadedDrillSessionHandler]): Handler whose motors, ROF scheduler and signals are used
+        """
+
+        self.session_handler = session_handler
+
+        # Completion of the last stage scheduled on each motor
+        self.motor_owners = {motor_name: motor_hlfb.done_completion()
+                             for motor_name in AIM_MOTORS + DROP_MOTORS + FEED_MOTORS}
+
+        # Completions of the previous ball's fire and return stages
+        self.prev_fire_done = motor_hlfb.done_completion()
+        self.prev_return_done = motor_hlfb.done_completion()
+
+        # Last step the aim stage went through and the yaw and pitch encoder counts it left (None if the axes or flywheels may be anywhere)
+        self.aimed_step = None
+        self.aimed_encoder_counts = None
+
+        # Whether an aborted shot left its ball in the feed, in which case the next shot does not drop another one
+        self.ball_in_feed = False
+
+        # Shots may be scheduled from more than one thread
+        self.lock = threading.Lock()
+
+    def run(self, drill_plan):
+        """Shoots every step of the drill plan and returns once the last ball's feed stroke is done
+
+        Args:
+            drill_plan ([list]): DrillPlanSteps in shooting order
+
+        Raises:
+            Exception: Whatever a stage raised, once the stages after it have been skipped
+        """
+
+        last_completion = motor_hlfb.done_completion()
+        for drill_plan_step in drill_plan:
+            last_completion = self.schedule_shot(drill_plan_step)
+
+        # Once the drill is cancelled, the stages left cut their waits short or are skipped, so this still returns quickly
+        last_completion.wait(cancellable=False)
+
+        # A stage that raised fails every stage scheduled after it, so the last one carries its exception
+        if last_completion.error is not None:
+            raise last_completion.error
+
+    def schedule_shot(self, drill_plan_step, shot_handle=None):
+        """Schedules the stages of one shot behind the stages that are already scheduled
+
+        Args:
+            drill_plan_step ([DrillPlanStep]): Step to shoot
+            shot_handle ([ShotHandle], optional): Handle of a manual shot. Its stages are skipped if it is cancelled before they start, and its move is recalculated from wherever the previous shot left the axes. Defaults to None.
+
+        Returns:
+            [MotorCompletion]: Done once the feed is back after shooting the ball
+        """
+
+        session_handler = self.session_handler
+
+        # Whether a motor's HLFB recovery aborted this shot while it was being aimed, and whether the ball was fired
+        shot_aborted = [False]
+        shot_fired = [False]
+
+        def aim():
+            if self.is_repeat_shot(drill_plan_step):
+                # Fire-only path: the axes and flywheels are already set, so there is nothing to move or wait for
+                print("Repeat of the previous shot, skipping aiming")
+                return
+
+            aim_step = drill_plan_step
+            if shot_handle is not None:
+                # Earlier queued shots may have been cancelled, so the relative move is only known now
+                aim_step = drill_plan_step._replace(shot_move=session_handler.shot_angle_table[(
+                    session_handler.prev_shot_loc, drill_plan_step.shot_loc)])
+            session_handler.shot_aborted = False
+            session_handler.run_aiming_stage(aim_step)
+            shot_aborted[0] = session_handler.shot_aborted
+            # Update shot location for relative test
+            session_handler.prev_shot_loc = drill_plan_step.shot_loc
+            # An aim cut short by a stop (or aborted) cannot be repeated without aiming again
+            self.aimed_step = None if drill_cancel.is_cancelled(
+            ) or shot_aborted[0] else drill_plan_step
+            self.aimed_encoder_counts = (
+                session_handler.ym.curr_encoder_count, session_handler.pm.curr_encoder_count)
+
+        def fire():
+            if shot_aborted[0]:
+                # The ball stays in the feed for the next shot
+                self.ball_in_feed = True
+                print("\n\nShot at {} aborted: a motor did not confirm its command".format(
+                    drill_plan_step.shot_loc))
+                return
+
+            print("\n\nShot location: {}".format(drill_plan_step.shot_loc))
+            lag = session_handler.rof_scheduler.wait_for_fire_time()
+            session_handler.shot_lag_signal.emit(lag)
+            session_handler.bfm.move_forward(
+                en_time=drill_plan_step.feed_stroke_time)
+            shot_fired[0] = True
+            if shot_handle is not None:
+                shot_handle.set_state("fired")
+
+        def drop():
+            if self.ball_in_feed:
+                self.ball_in_feed = False
+                print(
+                    "Ball of the aborted shot is still in the feed, skipping the queue drop")
+                return
+            session_handler.bqm_move_queue()
+
+        def feed_return():
+            if not shot_fired[0]:
+                return
+            session_handler.bfm.move_backward(
+                en_time=drill_plan_step.feed_stroke_time)
+            if shot_handle is not None:
+                shot_handle.set_state("done")
+            # Update the ball number in the GUI
+            session_handler.update_ball_num_signal.emit(True)
+
+        with self.lock:
+            # The flywheels must not change speed before the previous ball has left them
+            aim_done = self.schedule_stage(
+                AIM_MOTORS, aim, [self.prev_fire_done], shot_handle)
+            # A ball can only drop once the feed is back, so the turn overlaps this ball's aiming but not the previous ball's return stroke
+            # NOTE: The queue has no way to stage a ball without dropping it (its Input B is tied high and every Input A pulse is a full turn)
+            drop_done = self.schedule_stage(
+                DROP_MOTORS, drop, [self.prev_return_done], shot_handle)
+            fire_done = self.schedule_stage(
+                FEED_MOTORS, fire, [aim_done, drop_done], shot_handle)
+            return_done = self.schedule_stage(
+                FEED_MOTORS, feed_return, [], shot_handle)
+
+            self.prev_fire_done = fire_done
+            self.prev_return_done = return_done
+
+        if shot_handle is not None:
+            # A shot that never got to "done" (cancelled, drill stopped or a failed stage) ends up cancelled
+            return_done.add_done_callback(lambda _: shot_handle.set_state(
+                "cancelled", ["queued", "aiming", "fired"]))
+
+        return return_done
+
+    def is_repeat_shot(self, drill_plan_step):
+        """Returns whether the shot goes to the same location at the same speed as the last shot that was aimed, and nothing has moved the axes or flywheels since
+
+        NOTE 1: Aim stages run one after another, so this is only called once the previous aim stage is done
+        NOTE 2: Paths other than the engine command these motors too (e.g.: set_flywheel_speeds between playlist drills), so the encoder counts and the duty cycles in gpio_cache are checked instead of trusting aimed_step alone
+
+        Args:
+            drill_plan_step ([DrillPlanStep]): Step to shoot
+
+        Returns:
+            [bool]: True if aiming can be skipped, False otherwise
+        """
+
+        session_handler = self.session_handler
+        aimed_step = self.aimed_step
+        return aimed_step is not None \
+            and session_handler.prev_shot_loc == drill_plan_step.shot_loc \
+            and aimed_step.shot_loc == drill_plan_step.shot_loc \
+            and (session_handler.ym.curr_encoder_count, session_handler.pm.curr_encoder_count) == self.aimed_encoder_counts \
+            and gpio_cache.get_duty_cycle(session_handler.fmt.in_b_pin) == drill_plan_step.top_duty_cycle \
+            and gpio_cache.get_duty_cycle(session_handler.fmb.in_b_pin) == drill_plan_step.bottom_duty_cycle
+
+    def wait_for_idle(self, timeout=None):
+        """Blocks the thread until every scheduled stage has finished or been skipped
+
+        Args:
+            timeout ([float], optional): Timeout in seconds. Defaults to None (no timeout).
+
+        Returns:
+            [bool]: True if idle, False if timed out
+        """
+
+        with self.lock:
+            stage_completions = list(self.motor_owners.values())
+        return motor_hlfb.combine_completions(stage_completions).wait(timeout, cancellable=False)
+
+    def schedule_stage(self, motor_names, stage_command, dependencies, shot_handle=None):
+        """Makes the stage the owner of its motors and starts it on its own thread once its dependencies and the previous owners of its motors are done
+
+        Args:
+            motor_names ([tuple]): Names of the motors (session handler attributes) the stage uses
+            stage_command ([function]): Blocking function that runs the stage
+            dependencies ([list]): MotorCompletions of other stages that must be done first
+            shot_handle ([ShotHandle], optional): Handle of the shot the stage belongs to. Defaults to None.
+
+        Returns:
+            [MotorCompletion]: Done once the stage has finished (or was skipped because the drill was stopped or the shot was cancelled). Failed with the exception if the stage (or one it depends on) raised.
+        """
+
+        stage_done = motor_hlfb.MotorCompletion()
+        ready = motor_hlfb.combine_completions(
+            dependencies + [self.motor_owners[motor_name] for motor_name in motor_names])
+        for motor_name in motor_names:
+            self.motor_owners[motor_name] = stage_done
+
+        def run_stage():
+            try:
+                if ready.result == "failed":
+                    # A stage this one depends on raised, so it is skipped and fails the same way
+                    stage_done.set_failed(ready.error)
+                elif self.session_handler.run_drill and (shot_handle is None or shot_handle.start()):
+                    stage_command()
+            except Exception as error:
+                print("Shot stage failed: {}".format(error))
+                stage_done.set_failed(error)
+            finally:
+                # No-op if the stage already failed
+                stage_done.set_done()
+
+        # The callback may run on a Jetson.GPIO, pulse train or timeout watchdog thread, so the stage gets its own thread
+        ready.add_done_callback(lambda _: threading.Thread(
+            target=run_stage, daemon=True).start())
+
+        return stage_done
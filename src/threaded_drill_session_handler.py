@@ -21,16 +21,24 @@ except:
 finally:
     import csv
     import datetime
+    import queue
+    import threading
     import time
 
     from PyQt5.QtCore import QThread, pyqtSignal
 
-    import motor_ball_feed_vel
-    import motor_ball_queue_turn_once
-    import motor_flywheel_bottom
-    import motor_flywheel_top
-    import motor_pitch
-    import motor_yaw
+    import drill_cancel
+    import drill_plan
+    import motor_bring_up
+    import motor_context
+    import motor_hlfb
+    import motor_shutdown
+    import rof_scheduler
+    import shot_engine
+
+
+# Most manual shots that can be waiting to be shot at the same time
+MAX_QUEUED_SHOTS = 5
 
 
 class ThreadedDrillSessionHandler(QThread):
@@ -40,14 +48,26 @@ class ThreadedDrillSessionHandler(QThread):
     # Instantiating PyQt signals that will be used to communicate with the GUI
     run_drill_signal = pyqtSignal(bool)
     update_ball_num_signal = pyqtSignal(bool)
-
-    def __init__(self, distance_from_goal, drill_name=None, goalie_name=None):
+    shot_lag_signal = pyqtSignal(float)
+    command_done_signal = pyqtSignal(str)
+    command_failed_signal = pyqtSignal(str, str)
+    shot_state_signal = pyqtSignal(int, str)
+    stop_latency_signal = pyqtSignal(float)
+    machine_safe_signal = pyqtSignal(float)
+    drill_started_signal = pyqtSignal(int, str)
+    drill_finished_signal = pyqtSignal(int, str)
+    hlfb_timeout_signal = pyqtSignal(str, str)
+
+    def __init__(self, distance_from_goal, drill_name=None, goalie_name=None, aiming_mode="relative", feed_mode="timed", hlfb_recovery_policy="recheck"):
         """Initializes the drill session handler
 
         Args:
             distance_from_goal ([float]): The distance from Ball-E to the goal in feet
             drill_name ([str], optional): Name of the drill to be executed for an automated session. If manual training session, defaults to None.
             goalie_name ([str], optional): Goalie's name for an automated session. If manual training, defaults to None.
+            aiming_mode ([str], optional): "relative" moves yaw and pitch by the difference from the previous shot location, "absolute" moves them to each shot location's encoder count in one command. Defaults to "relative".
+            feed_mode ([str], optional): "timed" energizes each feed stroke for a fixed time, "hlfb" ends each feed stroke on the BFM's HLFB (falling back to "timed" unless motor_context uses the 2-position BFM driver with its HLFB wired). Defaults to "timed".
+            hlfb_recovery_policy ([str], optional): What to do once a re-check of the pin level shows a timed out HLFB command was not confirmed: "recheck" carries on, "retry" re-issues the command once and "abort" aborts the shot. Defaults to "recheck".
         """
 
         super().__init__()
@@ -57,120 +77,443 @@ class ThreadedDrillSessionHandler(QThread):
         self.goalie_name = goalie_name
         self.distance_from_goal = distance_from_goal
 
-        if self.drill_name is not None:
-            # Get drill information and save it
-            self.drill_info = self.get_profile_info()
+        if aiming_mode not in drill_plan.AIMING_MODES:
+            raise ValueError("Unknown aiming mode '{}'".format(aiming_mode))
+        self.aiming_mode = aiming_mode
 
-            # Acquire Rate of Fire (ROF) of the drill
-            self.rof = int(self.drill_info['1'][2])
+        # Manual training sessions shoot as soon as the GUI asks, so there is no Rate of Fire (ROF) until a drill is loaded
+        self.rof = None
+
+        # Keeps the drill at its ROF no matter how long each ball took to get ready
+        self.rof_scheduler = rof_scheduler.RofScheduler(self.rof)
 
         # Initialize Trajectory Algorithm Helper
         self.trajectory_algo = trajectory_algorithm.TrajectoryAlgorithm(
             self.distance_from_goal)
 
-        # Initialize all motors
-        self.bfm = motor_ball_feed_vel.MotorBallFeed()
-        self.bqm = motor_ball_queue_turn_once.MotorBallQueue()
-        self.fmt = motor_flywheel_top.MotorFlywheelTop()
-        self.fmb = motor_flywheel_bottom.MotorFlywheelBottom()
-        self.pm = motor_pitch.MotorPitch()
-        self.ym = motor_yaw.MotorYaw()
+        # Borrow all motors from the process-wide motor context, which sets their pins up only once
+        self.motor_context = motor_context.get_motor_context()
+        self.bfm = self.motor_context.bfm
+        self.bqm = self.motor_context.bqm
+        self.fmt = self.motor_context.fmt
+        self.fmb = self.motor_context.fmb
+        self.pm = self.motor_context.pm
+        self.ym = self.motor_context.ym
+
+        # The feed mode that is actually used, since the HLFB one may not be available
+        self.feed_mode = self.bfm.set_feed_mode(feed_mode)
+
+        # Every HLFB timeout is reported to the GUI, and an aborted command aborts the shot that is being aimed
+        # NOTE: The policy is handed to the HLFB monitors in start_drill, since they are shared with the other sessions
+        if hlfb_recovery_policy not in motor_hlfb.RECOVERY_POLICIES:
+            raise ValueError(
+                "Unknown recovery policy '{}'".format(hlfb_recovery_policy))
+        self.hlfb_recovery_policy = hlfb_recovery_policy
+        self.shot_aborted = False
+
+        # How many commands of each HLFB motor timed out during this session
+        self.hlfb_timeout_counts = dict()
+
+        # The distance from the goal is fixed for the whole session, so all shot moves are calculated once here
+        self.shot_angle_table = drill_plan.build_shot_angle_table(
+            self.trajectory_algo, self.ym, self.pm)
 
         # Stores previous shot location
-        self.prev_shot_loc = "CM"
+        self.prev_shot_loc = drill_plan.HOME_SHOT_LOC
+
+        # Whether the loaded drill has already been saved to the goalie's profile
+        self.drill_saved = False
+
+        if self.drill_name is not None:
+            # Compile the whole drill before any motor is energized, so errors in the drill surface now
+            # NOTE: Raises drill_plan.DrillPlanError if the drill cannot be executed
+            self.load_drill(self.compile_drill(self.drill_name))
+
+        # Commands the GUI posts for the worker thread (run), as (command name, arguments tuple) tuples
+        self.command_queue = queue.Queue()
+        self.drill_commands = {
+            "start": self.start_drill,
+            "automated": self.run_automated_drill,
+            "playlist": self.run_drill_playlist,
+            "shoot": self.run_manual_drill,
+            "queued_shot": self.schedule_manual_shot,
+            "stop": self.stop_drill,
+        }
+        # Whether stop_drill has already released the motors
+        # NOTE: Set under drill_stopped_lock, so that a stop posted by the GUI either cancels the drill before stop_drill resets the cancel or is ignored
+        self.drill_stopped = False
+        self.drill_stopped_lock = threading.Lock()
+        # time.monotonic() value the GUI asked to stop at, to measure how long stopping takes
+        self.stop_request_time = None
+
+        # Every shot (drills, "shoot" commands and shots submitted with submit_shot) runs on this one shot engine, so that only one stage at a time drives each motor
+        self.shot_engine = shot_engine.ShotEngine(self)
+        self.shot_handles = []
+        self.shot_count = 0
+
+    def post_command(self, command_name, *args):
+        """Queues a command for the worker thread and starts the thread if it is not running yet. Does not block, so it is safe to call from the GUI thread.
+
+        Args:
+            command_name ([str]): "start", "automated", "shoot" (with shot location and ball speed) or "stop"
+            args: Arguments of the command
+
+        Raises:
+            ValueError: If the command is unknown
+        """
+
+        if command_name not in self.drill_commands:
+            raise ValueError("Unknown drill command '{}'".format(command_name))
+
+        with self.drill_stopped_lock:
+            # An automated drill stops itself when it ends, after which the worker thread runs no more commands
+            # NOTE: drill_cancel is process-wide, so cancelling now would leave it set with nothing to reset it
+            if self.drill_stopped:
+                print("Drill has already stopped, ignoring '{}'".format(command_name))
+                return
+
+            if command_name == "stop" and self.stop_request_time is None:
+                self.stop_request_time = time.monotonic()
+                # The command in progress checks run_drill and every wait returns once drill_cancel is set, so the drill stops without waiting for its turn in the queue
+                self.run_drill = False
+                drill_cancel.cancel()
+
+        self.command_queue.put((command_name, args))
+
+        if not self.isRunning():
+            self.start()
+
+    def submit_shot(self, shot_loc, ball_speed):
+        """Queues a manual shot without waiting for it. Queued shots are shot back-to-back, with each shot's aiming overlapping the previous shot's feed stroke.
+
+        Args:
+            shot_loc ([str]): Shot location
+            ball_speed ([int]): Ball speed
+
+        Raises:
+            ShotQueueFullError: If MAX_QUEUED_SHOTS shots are already waiting
+            DrillPlanError: If the shot cannot be executed
+
+        Returns:
+            [ShotHandle]: Handle to follow (or cancel) the shot. Its state changes are also sent through shot_state_signal.
+        """
+
+        self.shot_handles = [
+            shot_handle for shot_handle in self.shot_handles if shot_handle.is_pending()]
+        if len(self.shot_handles) >= MAX_QUEUED_SHOTS:
+            raise shot_engine.ShotQueueFullError(
+                "{} shots are already queued".format(MAX_QUEUED_SHOTS))
+
+        shot_handle = self.create_shot_handle(shot_loc, ball_speed)
+        self.shot_handles.append(shot_handle)
+
+        self.post_command("queued_shot", shot_handle)
+        return shot_handle
+
+    def create_shot_handle(self, shot_loc, ball_speed):
+        """Compiles a manual shot and returns its handle, whose state changes are sent through shot_state_signal
+
+        Args:
+            shot_loc ([str]): Shot location
+            ball_speed ([int]): Ball speed
+
+        Raises:
+            DrillPlanError: If the shot cannot be executed
+
+        Returns:
+            [ShotHandle]: Handle of the shot (not scheduled yet)
+        """
+
+        # Compiling here surfaces errors right away. The move itself is recalculated when the shot is aimed.
+        drill_plan_step = drill_plan.compile_shot(
+            None, drill_plan.HOME_SHOT_LOC, shot_loc, ball_speed, self.shot_angle_table, self.fmt, self.fmb, self.bfm)
+
+        self.shot_count += 1
+        shot_handle = shot_engine.ShotHandle(self.shot_count, drill_plan_step)
+        shot_handle.add_state_callback(
+            lambda shot_handle, state: self.shot_state_signal.emit(shot_handle.shot_id, state))
+
+        return shot_handle
+
+    def schedule_manual_shot(self, shot_handle):
+        """Hands a submitted shot to the shot engine (does not block)
+
+        Args:
+            shot_handle ([ShotHandle]): Handle from submit_shot
+        """
+
+        self.shot_engine.schedule_shot(
+            shot_handle.drill_plan_step, shot_handle)
+
+    def run(self):
+        """Worker thread: runs the posted commands in order until the drill has been stopped. Results are sent to the GUI through command_done_signal and command_failed_signal.
+        """
+
+        while not self.drill_stopped:
+            command_name, args = self.command_queue.get()
+            try:
+                self.drill_commands[command_name](*args)
+            except Exception as error:
+                print("{} command failed: {}".format(command_name, error))
+                self.command_failed_signal.emit(command_name, str(error))
+            else:
+                self.command_done_signal.emit(command_name)
 
     def start_drill(self):
         """Executes all the steps required to start an automated or manual drill, such as enabling the motor
         """
 
+        # Waits may have been cancelled by a previous session
+        drill_cancel.reset()
+
+        # This session is told about the HLFB timeouts from now on
+        self.attach_hlfb_monitors()
+
         # Enable all motors
-        # NOTE 1: Order matters!
+        # NOTE 1: Order matters! Each motor lists the motors that must be ready before it is energized, and the rest are energized at the same time.
         # NOTE 2: BFM not energized since it will cause motor to move but it is pushed back a bit to ensure the feed is all the way back.
-        self.bfm_startup()
-        self.fmt.energize_motor()
-        self.fmb.energize_motor()
-        self.ym.energize_motor()
-        self.pm.energize_motor()
-        # NOTE: BQM may need to be enabled right before running the drill
-        self.bqm.energize_motor()
-
-        # Enabling motors takes time
-        # NOTE: This may need to be optimized after all the motors have been tuned to make the process faster
-        time.sleep(2)
+        bring_up_steps = [
+            motor_bring_up.BringUpStep("bfm", self.bfm_startup, [], None),
+            motor_bring_up.BringUpStep(
+                "fmt", lambda: self.fmt.energize_motor(block=False), [], self.fmt.energize_timeout),
+            motor_bring_up.BringUpStep(
+                "fmb", lambda: self.fmb.energize_motor(block=False), [], self.fmb.energize_timeout),
+            motor_bring_up.BringUpStep(
+                "ym", lambda: self.ym.energize_motor(block=False), [], self.ym.energize_timeout),
+            motor_bring_up.BringUpStep(
+                "pm", lambda: self.pm.energize_motor(block=False), [], self.pm.energize_timeout),
+            # NOTE: BQM may need to be enabled right before running the drill, and it must not drop a ball before the feed is all the way back
+            motor_bring_up.BringUpStep("bqm", lambda: self.bqm.energize_motor(block=False), [
+                                       "bfm", "fmt", "fmb", "ym", "pm"], None),
+        ]
+
+        # Returns as soon as every motor is ready, instead of after a fixed 2 seconds
+        self.motor_ready = motor_bring_up.bring_up_motors(bring_up_steps)
+
+    def compile_drill(self, drill_name, start_shot_loc=drill_plan.HOME_SHOT_LOC):
+        """Reads a drill's profile and compiles it into a drill plan, without changing the drill that is loaded
+
+        Args:
+            drill_name ([str]): Name of the drill
+            start_shot_loc ([str], optional): Shot location the machine is aimed at before the drill's first ball. Defaults to HOME_SHOT_LOC.
+
+        Raises:
+            DrillPlanError: If the drill cannot be executed
+
+        Returns:
+            [tuple]: Drill name, drill information, ROF, drill plan
+        """
+
+        # Get drill information
+        drill_info = self.get_profile_info(drill_name)
+
+        compiled_drill_plan = drill_plan.compile_drill_plan(
+            drill_info, self.shot_angle_table, self.fmt, self.fmb, self.bfm, start_shot_loc)
+
+        # Acquire Rate of Fire (ROF) of the drill (already validated by compile_drill_plan)
+        rof = drill_plan.get_drill_rof(drill_info)
+
+        # Order-insensitive drills (flagged in their own profile) are run in the order that moves the axes and flywheels the least
+        shot_order, block_size = drill_plan.get_drill_shot_order(drill_info)
+        compiled_drill_plan = drill_plan.reorder_drill_plan(
+            compiled_drill_plan, self.shot_angle_table, self.ym, self.pm, shot_order, block_size, start_shot_loc)
+
+        return drill_name, drill_info, rof, compiled_drill_plan
+
+    def load_drill(self, compiled_drill):
+        """Makes a compiled drill the one that is run next
+
+        Args:
+            compiled_drill ([tuple]): Drill from compile_drill
+        """
+
+        self.drill_name, self.drill_info, self.rof, self.drill_plan = compiled_drill
+        self.rof_scheduler.rof = self.rof
+        self.drill_saved = False
+
+    def run_drill_plan(self):
+        """Shoots every ball of the loaded drill
+        """
+        # The first ball is fired as soon as it is ready
+        self.rof_scheduler.reset()
+        # Go through each ball and shoot it, overlapping the next ball's aiming and drop with the current ball's feed stroke
+        self.shot_engine.run(self.drill_plan)
 
     def run_automated_drill(self):
         """Runs an automated drill session
         """
-        # Go through each ball and shoot it
-        for each_ball_info in self.drill_info.values():
-            self.run_manual_drill(
-                shot_loc=each_ball_info[0], ball_speed=int(each_ball_info[1]))
-            # Update the ball number in the GUI
-            self.update_ball_num_signal.emit(True)
-        # When complete, stop the drill
-        self.stop_drill()
+        try:
+            self.run_drill_plan()
+        finally:
+            # When complete (or if a shot failed), stop the drill
+            self.stop_drill()
+
+    def run_drill_playlist(self, drill_names, holding_speed=None):
+        """Runs several drills back-to-back without stopping the machine in between. The axes stay where the last ball left them, and each drill is saved to the goalie's profile as soon as it is done.
+
+        Args:
+            drill_names ([list]): Names of the drills, in the order they are run
+            holding_speed ([int], optional): Ball speed the flywheels are held at between drills. Defaults to None (they keep the last ball's speed).
+
+        Raises:
+            DrillPlanError: If any drill cannot be executed (before any ball of the playlist is shot)
+        """
+
+        # Compile every drill first, each one starting from where the previous one ends, so errors surface before the first ball
+        compiled_drills = []
+        start_shot_loc = self.prev_shot_loc
+        for drill_name in drill_names:
+            compiled_drill = self.compile_drill(drill_name, start_shot_loc)
+            compiled_drills.append(compiled_drill)
+            start_shot_loc = compiled_drill[3][-1].shot_loc
+
+        try:
+            for drill_num, compiled_drill in enumerate(compiled_drills, 1):
+                if not self.run_drill:
+                    break
+
+                self.load_drill(compiled_drill)
+                self.drill_started_signal.emit(drill_num, self.drill_name)
+                self.run_drill_plan()
+                if not self.run_drill:
+                    break
+
+                # Save the drill profile to the goalie's name
+                if self.goalie_name is not None:
+                    self.save_drill_to_goalie_profile()
+                self.drill_finished_signal.emit(drill_num, self.drill_name)
+
+                # Hold the flywheels instead of spinning them down, so the next drill's first ball is ready sooner
+                if holding_speed is not None and drill_num < len(compiled_drills):
+                    self.set_flywheel_speeds(holding_speed)
+        finally:
+            # When complete (or if a shot failed), stop the drill
+            self.stop_drill()
 
     def run_manual_drill(self, shot_loc, ball_speed):
         """Runs a manual drill session
 
+        NOTE: The shot goes through the shot engine like a submitted shot (behind any that is still queued), and this returns once it is done
+
         Args:
             shot_loc ([str]): Shot location
             ball_speed ([int]): Ball speed
+
+        Raises:
+            DrillPlanError: If the shot cannot be executed
         """
         if self.run_drill:
-            print("\n\nShot location: {}".format(shot_loc))
-            # 1. Adjust pitch and yaw motor appropriately
-            # 1.1: Get which goal area it the drill shot needs to happen in terms of angle that pitch and yaw need to be adjusted
-            yaw_angle, pitch_angle = self.get_shot_angles(shot_loc)
-            # print("curr yaw angle: {}".format(yaw_angle))
-            # print("curr pitch angle: {}".format(pitch_angle))
-            prev_yaw_angle, prev_pitch_angle = self.get_shot_angles(
-                self.prev_shot_loc)
-            # print("prev yaw angle: {}".format(prev_yaw_angle))
-            # print("prev pitch angle: {}".format(prev_pitch_angle))
-
-            # This is the relative angle we want to move the pitch and yaw contraptions by
-            target_yaw_angle = yaw_angle - prev_yaw_angle
-            target_pitch_angle = pitch_angle - prev_pitch_angle
-            # print("curr-prev yaw angle: {}".format(target_yaw_angle))
-            # print("curr-prev pitch angle: {}\n".format(target_pitch_angle))
-
-            # 1.2: Set pitch and yaw at that angle
-            if target_yaw_angle < 0:
-                self.ym.move_left(target_yaw_angle)
-            elif target_yaw_angle > 0:
-                self.ym.move_right(target_yaw_angle)
-            else:
-                pass
-            if target_pitch_angle < 0:
-                self.pm.pitch_down(target_pitch_angle)
-            elif target_pitch_angle > 0:
-                self.pm.pitch_up(target_pitch_angle)
-            else:
-                pass
+            shot_handle = self.create_shot_handle(shot_loc, ball_speed)
+            shot_completion = self.shot_engine.schedule_shot(
+                shot_handle.drill_plan_step, shot_handle)
+            shot_completion.wait()
+            # A stage of the shot raised
+            if shot_completion.error is not None:
+                raise shot_completion.error
 
-            # 2. Set the speed of both flywheels
-            self.set_flywheel_speeds(ball_speed)
+    def run_aiming_stage(self, drill_plan_step):
+        """Moves the yaw and pitch motors and spins up both flywheels concurrently, and returns once all of them are done
 
-            # 3. Drop a ball by moving the ball queue motor
-            self.bqm_move_queue()
+        Args:
+            drill_plan_step ([DrillPlanStep]): Step holding the yaw/pitch move (or positions) and flywheel duty cycles
+        """
 
-            # 4. Shoot the ball
-            self.bfm_shoot_movement()
+        shot_move = drill_plan_step.shot_move
+
+        # The yaw, pitch and flywheel motors are mechanically independent, so each one gets its own task
+        motor_tasks = []
+        if self.aiming_mode == "absolute":
+            # One command per axis, no matter where the previous shot went
+            motor_tasks.append(
+                (self.ym.move_to, (drill_plan_step.yaw_position,)))
+            motor_tasks.append(
+                (self.pm.move_to, (drill_plan_step.pitch_position,)))
+        else:
+            if shot_move.yaw_angle < 0:
+                motor_tasks.append(
+                    (self.ym.move_left, (shot_move.yaw_angle, shot_move.yaw_pulses)))
+            elif shot_move.yaw_angle > 0:
+                motor_tasks.append(
+                    (self.ym.move_right, (shot_move.yaw_angle, shot_move.yaw_pulses)))
+            if shot_move.pitch_angle < 0:
+                motor_tasks.append(
+                    (self.pm.pitch_down, (shot_move.pitch_angle, shot_move.pitch_pulses)))
+            elif shot_move.pitch_angle > 0:
+                motor_tasks.append(
+                    (self.pm.pitch_up, (shot_move.pitch_angle, shot_move.pitch_pulses)))
+        motor_tasks.append(
+            (self.fmt.set_duty_cycle, (drill_plan_step.top_duty_cycle,)))
+        motor_tasks.append(
+            (self.fmb.set_duty_cycle, (drill_plan_step.bottom_duty_cycle,)))
+
+        self.run_motor_tasks(motor_tasks)
+
+    def run_motor_tasks(self, motor_tasks):
+        """Issues each motor command without blocking on it, then waits for all of the motors to confirm their commands together
 
-            # Update shot location for relative test
-            self.prev_shot_loc = shot_loc
+        Args:
+            motor_tasks ([list]): List of (motor method, arguments tuple) tuples. Each motor method must accept block=False and return a MotorCompletion.
+
+        Returns:
+            [bool]: True if every motor confirmed its command, False if the latest deadline was reached first
+        """
 
-    def get_shot_angles(self, shot_loc):
-        """Returns the shot angles required for pitch and yaw from set distance
+        # Pulses are emitted by each motor's timing thread, so issuing the commands does not block
+        completions = [motor_method(*args, block=False)
+                       for motor_method, args in motor_tasks]
+
+        # The slowest motor decides how long this takes
+        return motor_hlfb.combine_completions(completions).wait()
+
+    def get_hlfb_motors(self):
+        """Returns the motors whose commands are confirmed by their HLFB
+
+        Returns:
+            [dict]: Motors keyed by name
+        """
+
+        hlfb_motors = {"fmt": self.fmt, "fmb": self.fmb,
+                       "ym": self.ym, "pm": self.pm}
+        if self.bfm.hlfb is not None:
+            hlfb_motors["bfm"] = self.bfm
+        return hlfb_motors
+
+    def hlfb_timed_out(self, motor_name, action):
+        """Called by a motor's HLFB monitor every time one of its commands times out
 
         Args:
-            shot_loc (string): Shot location on the lacrosse goal (TL, TM, TR, CL, CM, CR, BL, BM, BR)
+            motor_name ([str]): Name of the motor
+            action ([str]): What the monitor did about it ("recovered", "retried", "aborted" or "timed out")
+        """
+
+        self.hlfb_timeout_counts[motor_name] = self.hlfb_timeout_counts.get(
+            motor_name, 0) + 1
+        if action == "aborted":
+            self.shot_aborted = True
+        self.hlfb_timeout_signal.emit(motor_name, action)
+
+    def attach_hlfb_monitors(self):
+        """Hands this session's recovery policy and timeout callback to the HLFB monitors, which belong to the process-wide motor context
+        """
+
+        for hlfb_motor in self.get_hlfb_motors().values():
+            hlfb_motor.hlfb.set_recovery_policy(
+                self.hlfb_recovery_policy, self.hlfb_timed_out)
+
+    def detach_hlfb_monitors(self):
+        """Puts the HLFB monitors back to their defaults, so that the timeouts of later sessions are not reported to this one
+        """
+
+        for hlfb_motor in self.get_hlfb_motors().values():
+            hlfb_motor.hlfb.set_recovery_policy("recheck")
+
+    def get_hlfb_timeout_counts(self):
+        """Returns how many commands of each HLFB motor have timed out during this session
 
         Returns:
-            [tuple]: Yaw degree, Pitch degree
+            [dict]: Number of timeouts keyed by motor name
         """
-        return (self.trajectory_algo.calc_yaw(shot_loc), self.trajectory_algo.calc_pitch(shot_loc))
+        return {motor_name: self.hlfb_timeout_counts.get(motor_name, 0) for motor_name in self.get_hlfb_motors()}
 
     def bqm_move_queue(self):
         """Rotates the ball queue so that a ball can drop into the ball feed
@@ -183,21 +526,18 @@ class ThreadedDrillSessionHandler(QThread):
 
         self.bfm.move_backward(en_time=0.25)
 
-    def bfm_shoot_movement(self):
+    def bfm_shoot_movement(self, feed_stroke_time=None):
         """Ball feeding mechanism movement
+
+        Args:
+            feed_stroke_time ([float], optional): How long each direction of the bfm movement takes. Defaults to the BFM's stroke time.
         """
 
         # Move the feed motor forward, wait for it to get caught into the flywheels, then come back
         # Currently waiting 1.1 seconds each direction of the bfm movement
-        # 2.2 seconds total
-        # So wait (ROF-2.2)/2 in each direction and hope that the LAX ball has fallen by then
-
-        if self.drill_name is not None:
-            time.sleep((self.rof-2.2)/2)
-        self.bfm.move_forward()
-        self.bfm.move_backward()
-        if self.drill_name is not None:
-            time.sleep((self.rof-2.2)/2)
+        # NOTE: The ROF is kept by self.rof_scheduler before this is called, so there is no waiting here
+        self.bfm.move_forward(en_time=feed_stroke_time)
+        self.bfm.move_backward(en_time=feed_stroke_time)
 
     def set_flywheel_speeds(self, speed):
         """Top and Bottom Flywheels speed setter
@@ -206,31 +546,52 @@ class ThreadedDrillSessionHandler(QThread):
             speed ([int]): Target speed for flywheels
         """
 
-        # Set the flywheel speeds
-        self.fmt.set_speed(speed)
-        self.fmb.set_speed(speed)
+        # Set the flywheel speeds (both flywheels spin up at the same time)
+        self.run_motor_tasks(
+            [(self.fmt.set_speed, (speed,)), (self.fmb.set_speed, (speed,))])
 
     def stop_drill(self):
         """Executes all steps required when drill has been stopped or has ended
         """
+        # An automated drill stops itself when it ends, so a stop posted by the GUI can come after that
+        with self.drill_stopped_lock:
+            if self.drill_stopped:
+                return
+            self.drill_stopped = True
+
         self.run_drill = False
         # Stop running the drill
         self.run_drill_signal.emit(False)
 
-        # Save the drill profile to the goalie's name
-        if self.goalie_name is not None:
-            self.save_drill_to_goalie_profile()
+        # Queued manual shots that have not started are skipped, and the waits of the one in progress have been cut short
+        self.shot_engine.wait_for_idle()
+
+        # The yaw and pitch pulse trains stop between two pulses and drop the trains still queued. They must be done before the cancel is reset, or the rest of their pulses would still be emitted.
+        for motor in (self.ym, self.pm):
+            motor.pulse_train.wait_for_idle()
+
+        # The motors are about to be reset, which has to wait for their strokes and HLFB edges again
+        drill_cancel.reset()
 
-        # Stop and reset all motors
-        self.bfm.stop_and_reset_motor()
-        self.bqm.stop_and_reset_motor()
-        self.fmt.stop_and_reset_motor()
-        self.fmb.stop_and_reset_motor()
-        self.ym.stop_and_reset_motor()
-        self.pm.stop_and_reset_motor()
+        # Resetting the motors is not part of the drill, so its HLFB timeouts are neither retried nor counted against this session
+        self.detach_hlfb_monitors()
 
-        # Wait to kill thread
-        self.wait()
+        # Measured up to the point the remaining motors are commanded to stop (the axes already have)
+        if self.stop_request_time is not None:
+            stop_latency = time.monotonic() - self.stop_request_time
+            print("Stop took {:.3f} s until the motors were commanded to stop".format(
+                stop_latency))
+            self.stop_latency_signal.emit(stop_latency)
+
+        # Stop and reset all motors at the same time, then tell the GUI the machine is safe
+        # NOTE: The channels stay set up for the next session. The motor context cleans them up at application exit.
+        reset_times = motor_shutdown.shut_down_motors(
+            self.motor_context.get_motors(), release=False)
+        self.machine_safe_signal.emit(max(reset_times.values()))
+
+        # Save the drill profile to the goalie's name (unless a playlist has already saved it)
+        if self.goalie_name is not None and not self.drill_saved:
+            self.save_drill_to_goalie_profile()
 
     def save_drill_to_goalie_profile(self):
         """save_drill_to_goalie_profile.
@@ -247,14 +608,22 @@ class ThreadedDrillSessionHandler(QThread):
                 datetime.datetime.today().strftime("%m/%d/%Y"))]
             csv_writer.writerow(drill_info)
 
-    def get_profile_info(self):
+        self.drill_saved = True
+
+    def get_profile_info(self, drill_name=None):
         """get_profile_info.
 
         This function acquires and formats pertaining drill information
+
+        Args:
+            drill_name ([str], optional): Name of the drill. Defaults to the loaded drill.
         """
 
+        if drill_name is None:
+            drill_name = self.drill_name
+
         drill_path = str(Path.home())+"/Documents/ball_e_profiles/drill_profiles/{drill_name}/{drill_name}.csv".format(
-            drill_name=self.drill_name)
+            drill_name=drill_name)
         with open(drill_path) as file:
             csv_reader = csv.reader(file, delimiter=',')
             row_count = 0
@@ -262,8 +631,9 @@ class ThreadedDrillSessionHandler(QThread):
             for row in csv_reader:
                 if row_count == 0:
                     row_count += 1
-                else:
-                    info_dict[row[0]] = [row[1], row[2], row[3]]
+                elif row:
+                    # NOTE: Missing columns are left for drill_plan.compile_drill_plan to report
+                    info_dict[row[0]] = row[1:]
                     row_count += 1
 
         return info_dict
@@ -277,10 +647,9 @@ def run_manual_session():
 
     manual_session = ThreadedDrillSessionHandler(10)
     print("Enabling all motors...")
-    manual_session.start_drill()
-    time.sleep(2)
+    manual_session.post_command("start")
     print("Shoot at TR with speed 30...")
-    manual_session.run_manual_drill(shot_loc="TR", ball_speed=30)
+    manual_session.post_command("shoot", "TR", 30)
     # time.sleep(2)
     #print("Shoot at BL with speed 30...")
     #manual_session.run_manual_drill(shot_loc="BL", ball_speed=30)
@@ -297,7 +666,11 @@ def run_manual_session():
     # print("Shoot at BM with speed 100...")
     # manual_session.run_manual_drill(shot_loc="BM", ball_speed=100)
     # time.sleep(5)
-    manual_session.stop_drill()
+    # Stopping cancels the shots that have not been shot yet, so give them time first
+    time.sleep(5)
+    manual_session.post_command("stop")
+    # Wait for the worker thread to finish
+    manual_session.wait()
 
 
 def run_automated_session():
@@ -307,8 +680,10 @@ def run_automated_session():
     """
 
     automated_session = ThreadedDrillSessionHandler(10, drill_name="t_drill")
-    automated_session.start_drill()
-    automated_session.run_automated_drill()
+    automated_session.post_command("start")
+    automated_session.post_command("automated")
+    # Wait for the worker thread to finish
+    automated_session.wait()
 
 
 def main():